@@ -1,107 +1,179 @@
-from faster_whisper import WhisperModel
+import hashlib
 import os
-import ollama
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-# --------------------------
-# Environment Setup
-# --------------------------
-os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "1"
-os.environ["HF_HUB_DISABLE_SYMLINKS"] = "1"
-
-# --------------------------
-# Preload Models
-# --------------------------
-print("Initializing llama client...")
-client = ollama.Client()
+import cache
+from metrics import span
+from chunking import transcribe_long, LONG_AUDIO_SECONDS, Segment
+from ingest import Recording, TRIM_KEY
+from icd10 import review_codes, codes_verified
+from llm import LLM_MODEL, NUM_CTX
+from models import get_whisper_model, get_llm_client, resolve_whisper_config, whisper_config, WHISPER_DRAFT_MODEL
+from note import parse_note, ClinicalNote, NOTE_SCHEMA
 
-print("Loading Whisper model on GPU...")
-whisper_model = WhisperModel(
-    "large",          # You can switch to "medium" or "large" if GPU allows
-    device="cuda",
-    compute_type="float16"
-)
-print("Whisper model loaded.")
+BEAM_SIZE = 5
+TASK = "translate"  # Auto translate to English
+JSON_NOTES = os.environ.get("SCRIBE_JSON_NOTES", "0") == "1"  # ask llama for schema-constrained JSON
 
 
 # --------------------------
 # structured prescription
 # --------------------------
 def stru_pres(raw_text):
-    lines = [line.strip() for line in raw_text.split("\n") if line.strip()]
-    extracted_text = ""
-    for line in lines:
-        lower_line = line.lower()
-
-        if "chief complaint" in lower_line:
-            extracted_text += f"\n📝 Chief Complaint\n{line.replace('Chief Complaint', '').strip()}\n"
-        elif "history of present illness" in lower_line:
-            extracted_text += f"\n📖 History of Present Illness\n{line.replace('History of Present Illness', '').strip()}\n"
-        elif "relevant past history" in lower_line:
-            extracted_text += f"\n📜 Relevant Past History\n{line.replace('Relevant Past History', '').strip()}\n"
-        elif "symptoms & examination findings" in lower_line:
-            extracted_text += f"\n🔍 Symptoms & Examination Findings\n{line.replace('Symptoms & Examination Findings', '').strip()}\n"
-        elif "assessment" in lower_line:
-            extracted_text += f"\n🩺 Assessment / Impression\n{line.replace('Assessment / Impression', '').strip()}\n"
-        elif "plan" in lower_line:
-            extracted_text += f"\n🧾 Plan\n{line.replace('Plan', '').strip()}\n"
-        elif "suggested medications" in lower_line:
-            extracted_text += f"\n💊 Suggested Medications (with purpose)\n"
-        elif "predicted medications" in lower_line:
-            extracted_text += f"\n💊 Predicted Medications (with purpose)\n"
-        elif "predicted disease" in lower_line:
-            extracted_text += f"\n🩸 Predicted Disease\n"
-        else:
-            extracted_text += line + "\n"
-
-    #print(extracted_text)
-    return(extracted_text)
+    """
+    Format raw llama output into the sectioned emoji note (see note.py).
+    """
+    with span("parse"):
+        return parse_note(raw_text).to_text()
+
 # --------------------------
 # llama3 Helper
 # --------------------------
 
-def ask_llama(prompt: str, model_name: str = "llama3.1:8b") -> str:
+def ask_llama(prompt: str, model_name: str = LLM_MODEL) -> str:
     """
     Sends a prompt to llama3 and returns the response.
     """
     print("Sending request to llama3 model...")
     try:
-        response = client.generate(
+        response = get_llm_client().generate(
             model=model_name,
             prompt=prompt,
-            stream=False
+            stream=False,
+            options={"num_ctx": NUM_CTX}
         )
         #return response.response
-        text=stru_pres(response.response)
+        text=review_codes(stru_pres(response.response))
         return text
     except Exception as e:
         return f"Error: {e}"
 
+def _stream_llama(prompt: str, model_name: str = LLM_MODEL):
+    """
+    Yields the structured note so far while llama3 streams tokens.
+    All complete lines are re-parsed whenever a newline arrives (a heading
+    and its body often come in different chunks), so the final note matches
+    parsing the whole response at once; the unfinished last line is shown
+    raw until it completes. Only the final parse is timed.
+    """
+    note = ""
+    raw = ""
+    done = -1   # index of the last newline in raw
+    for chunk in get_llm_client().generate(
+        model=model_name,
+        prompt=prompt,
+        stream=True,
+        options={"num_ctx": NUM_CTX}
+    ):
+        raw += chunk.response
+        if "\n" in chunk.response:
+            done = raw.rindex("\n")
+            note = parse_note(raw[:done]).to_text()
+        yield note + raw[done + 1:]
+    yield stru_pres(raw)
+
+def _json_llama(prompt: str, model_name: str = LLM_MODEL):
+    """
+    Asks llama for the note as JSON matching NOTE_SCHEMA, skipping free-text parsing.
+    Yields once: JSON cannot be shown until it is complete.
+    """
+    response = get_llm_client().generate(
+        model=model_name,
+        prompt=prompt,
+        stream=False,
+        format=NOTE_SCHEMA,
+        options={"num_ctx": NUM_CTX}
+    )
+    yield ClinicalNote.from_json(response.response).to_text()
+
 # --------------------------
-# Audio Processing Function
+# Transcription
 # --------------------------
-def audio_pres(audio_path: str) -> str:
+def transcribe(audio, model=None, beam_size: int = BEAM_SIZE):
     """
-    Transcribe audio to English, detect language, and generate structured medical note.
+    Start Whisper on the audio (a path or 16 kHz mono samples) and return
+    (segments generator, info). Segments are decoded lazily as the
+    generator is consumed.
     """
-    # 1️⃣ Transcribe & Translate
-    segments, info = whisper_model.transcribe(
-        audio_path,
-        beam_size=5,
-        task="translate"  # Auto translate to English
+    segments, info = (model or get_whisper_model()).transcribe(
+        audio,
+        beam_size=beam_size,
+        task=TASK
     )
     print(f"Detected predominant language: {info.language}")
+    return segments, info
 
-    # 2️⃣ Build structured transcript
-    transcript_lines = [
-        f"[{seg.start:.2f}s - {seg.end:.2f}s] : {seg.text.strip()}"
-        for seg in segments
-    ]
-    transcript_text = "\n".join(transcript_lines)
-    print("\n--- Transcript ---\n")
-    print(transcript_text)
+def format_segment(seg) -> str:
+    return f"[{seg.start:.2f}s - {seg.end:.2f}s] : {seg.text.strip()}"
+
+def audio_duration(audio_path: str) -> float:
+    """
+    Duration in seconds from the container header, without decoding.
+    """
+    import av
+    with span("audio_probe"), av.open(audio_path) as container:
+        if container.duration is not None:
+            return container.duration / 1_000_000
+        stream = container.streams.audio[0]
+        return float(stream.duration * stream.time_base) if stream.duration else 0.0
+
+def transcript_lines(audio, tier: str = "final"):
+    """
+    Yields timestamped transcript lines, served from the cache when the same
+    audio was already transcribed with the same Whisper settings.
+    `audio` is a path or an ingest.Recording; the recording is decoded once
+    and silence-trimmed before Whisper, and timestamps are mapped back to
+    the original recording. tier="draft" uses the small draft model with
+    greedy decoding for a quick first transcript.
+    """
+    rec = audio if isinstance(audio, Recording) else Recording(audio)
+    if tier == "draft":
+        size, device, compute_type = resolve_whisper_config(WHISPER_DRAFT_MODEL)
+        beam_size, stage = 1, "whisper_draft"
+    else:
+        size, device, compute_type = resolve_whisper_config()
+        beam_size, stage = BEAM_SIZE, "whisper"
+    long_audio = audio_duration(rec.path) > LONG_AUDIO_SECONDS
+    mode = "chunked" if long_audio else "full"
+
+    def key():
+        # Keyed by the model that actually runs, not the one requested (GPU fallback)
+        loaded_size, _, loaded_compute_type = whisper_config(size, device, compute_type)
+        return cache.transcript_key(rec.digest, f"{loaded_size}/{loaded_compute_type}/{mode}/{TRIM_KEY}",
+                                    beam_size, TASK)
+    cached = cache.get("transcripts", key())
+    if cached is not None:
+        print("Transcript cache hit.")
+        yield from cached.split("\n") if cached else []
+        return
 
-    # 3️⃣ llama3 Prompt Rules
-    rules = """
+    start = time.time()
+    samples = rec.trimmed()
+    model = get_whisper_model(size, device, compute_type)
+    if long_audio:
+        # Split at silences and transcribe chunks in parallel
+        segments = transcribe_long(samples, beam_size, TASK, model=model)
+    else:
+        segments, info = transcribe(samples, model, beam_size)
+    lines = []
+    with span(stage):
+        for seg in segments:
+            seg = Segment(rec.original_time(seg.start), rec.original_time(seg.end), seg.text)
+            line = format_segment(seg)
+            lines.append(line)
+            yield line
+    print(f"Transcribed {len(lines)} segments ({tier}, {size}, {mode}) in {time.time() - start:.1f}s")
+    cache.put("transcripts", key(), "\n".join(lines))
+
+# --------------------------
+# Prompt
+# --------------------------
+# Only ask plainly for codes when a complete index will catch the wrong ones
+CODE_RULE = ("Give ICD-10-CM codes in parentheses." if codes_verified()
+             else "Use ICD-10-CM codes only if it is correct, double check that otherwise leave it.")
+RULES = f"""
 1. Write only clinical information from the conversation.  
 2. Use concise, professional medical language.  
 3. Structure output as:  
@@ -113,15 +185,16 @@ def audio_pres(audio_path: str) -> str:
    - Plan  
 4. Do not invent or assume details.  
 5. Do not include demographics, identifiers, or dates.  
-6. Use ICD-10-CM codes only if it is correct, double check that otherwise leave it.  
+6. {CODE_RULE}  
 7. If it is not a doctor–patient conversation, output: "Not a conversation".  
 8. End after **Probable Diagnosis** and do not repeat the note.
 """
 
-    prompt = f"""
+def build_prompt(transcript_text: str, label: str = "Conversation with timestamp") -> str:
+    return f"""
 Convert the following doctor-patient conversation into standard format.
-Follow these rules: {rules}
-Conversation with timestamp:
+Follow these rules: {RULES}
+{label}:
 {transcript_text}
 
 At the end, provide:
@@ -130,17 +203,179 @@ At the end, provide:
 - Predicted disease (if confident), only disease name otherwise give exactly "NOT SURE"
 """
 
-    # 4️⃣ Ask llama3
-    answer = ask_llama(prompt)
+# Changes whenever the rules or prompt template change, invalidating cached notes
+PROMPT_VERSION = hashlib.sha256(build_prompt("").encode("utf-8")).hexdigest()[:12]
+
+# --------------------------
+# Token Budget
+# --------------------------
+MAX_OUTPUT_TOKENS = 1024
+PROMPT_BUDGET = NUM_CTX - MAX_OUTPUT_TOKENS
+MAP_WINDOW_TOKENS = int(os.environ.get("SCRIBE_MAP_WINDOW_TOKENS", "3000"))
+MAP_WORKERS = int(os.environ.get("SCRIBE_MAP_WORKERS", "2"))
+MAX_REDUCE_ROUNDS = 3
+CHARS_PER_TOKEN = 4   # rough average for English text with llama tokenizers
+
+_TIMESTAMP = re.compile(r"^\[(\d+(?:\.\d+)?)s - \d+(?:\.\d+)?s\] : ", re.MULTILINE)
+
+MAP_PROMPT = """
+Below is one part of a longer doctor-patient conversation.
+List every clinical fact it contains (complaints, history, symptoms, findings,
+assessment, plan, medications) as short bullet points.
+Do not invent details and do not add headings.
+Conversation part:
+{part}
+"""
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def compact_timestamps(transcript_text: str) -> str:
+    """
+    [75.20s - 80.00s] : text  ->  [1:15] text
+    """
+    def short(m):
+        secs = int(float(m.group(1)))
+        return f"[{secs // 60}:{secs % 60:02d}] "
+    return _TIMESTAMP.sub(short, transcript_text)
+
+def strip_timestamps(transcript_text: str) -> str:
+    return _TIMESTAMP.sub("", transcript_text)
+
+def split_windows(text: str, window_tokens: int):
+    """
+    Split text on line boundaries into windows of about window_tokens each.
+    """
+    windows, current, size = [], [], 0
+    for line in text.split("\n"):
+        tokens = estimate_tokens(line)
+        if current and size + tokens > window_tokens:
+            windows.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += tokens
+    if current:
+        windows.append("\n".join(current))
+    return windows
+
+def map_summaries(text: str, model_name: str = LLM_MODEL):
+    """
+    Map step: summarize each window of the transcript in parallel.
+    """
+    def summarize(part):
+        response = get_llm_client().generate(
+            model=model_name,
+            prompt=MAP_PROMPT.format(part=part),
+            stream=False,
+            options={"num_ctx": NUM_CTX}
+        )
+        return response.response.strip()
+
+    windows = split_windows(text, MAP_WINDOW_TOKENS)
+    with span("llm_map"), ThreadPoolExecutor(max_workers=MAP_WORKERS) as pool:
+        return list(pool.map(summarize, windows))
+
+def prepare_prompt(transcript_text: str, model_name: str = LLM_MODEL) -> str:
+    """
+    Build a note prompt that fits PROMPT_BUDGET: first shorten, then drop the
+    timestamps, and for transcripts still too long map-reduce the
+    conversation into per-window summaries merged by the final prompt.
+    """
+    attempts = (
+        ("full timestamps", transcript_text, "Conversation with timestamp"),
+        ("short timestamps", compact_timestamps(transcript_text), "Conversation with timestamp"),
+        ("no timestamps", strip_timestamps(transcript_text), "Conversation"),
+    )
+    for mode, text, label in attempts:
+        prompt = build_prompt(text, label)
+        tokens = estimate_tokens(prompt)
+        if tokens <= PROMPT_BUDGET:
+            print(f"Prompt: ~{tokens} tokens ({mode}, budget {PROMPT_BUDGET})")
+            return prompt
+
+    start = time.time()
+    text = compact_timestamps(transcript_text)
+    rounds = 0
+    while True:
+        parts = map_summaries(text, model_name)
+        rounds += 1
+        text = "\n\n".join(f"Part {i + 1}:\n{p}" for i, p in enumerate(parts))
+        prompt = build_prompt(text, "Summaries of consecutive parts of the conversation")
+        tokens = estimate_tokens(prompt)
+        if tokens <= PROMPT_BUDGET or len(parts) == 1 or rounds == MAX_REDUCE_ROUNDS:
+            break
+    print(f"Prompt: ~{tokens} tokens (map-reduce, {len(parts)} parts, {rounds} rounds, "
+          f"map {time.time() - start:.1f}s, budget {PROMPT_BUDGET})")
+    return prompt
+
+# --------------------------
+# Note Generation
+# --------------------------
+def generate_note_stream(transcript_text: str, model_name: str = LLM_MODEL, raise_errors: bool = False):
+    """
+    Yields the structured note so far; a cached note for the same transcript,
+    model and prompt version is returned at once. The finished note's
+    ICD-10-CM codes are checked against the local index (icd10.py); the
+    cache keeps the unchecked note so index updates apply to it too.
+    """
+    key = cache.note_key(transcript_text, model_name, PROMPT_VERSION + ("/json" if JSON_NOTES else ""))
+    cached = cache.get("notes", key)
+    if cached is not None:
+        print("Note cache hit.")
+        yield review_codes(cached)
+        return
+
+    note = ""
+    try:
+        with span("prompt"):
+            prompt = prepare_prompt(transcript_text, model_name)
+        print("Streaming request to llama3 model...")
+        start = time.time()
+        generate = _json_llama if JSON_NOTES else _stream_llama
+        with span("llm"):
+            for note in generate(prompt, model_name):
+                yield note
+        print(f"Note generated in {time.time() - start:.1f}s (~{estimate_tokens(note)} tokens)")
+    except Exception as e:
+        if raise_errors:
+            raise
+        yield note + f"\nError: {e}"
+        return
+    checked = review_codes(note)
+    if checked != note:
+        yield checked
+    cache.put("notes", key, note)
+
+def generate_note(transcript_text: str, model_name: str = LLM_MODEL, raise_errors: bool = False) -> str:
+    note = ""
+    for note in generate_note_stream(transcript_text, model_name, raise_errors):
+        pass
+    return note
+
+# --------------------------
+# Audio Processing Function
+# --------------------------
+def audio_pres(audio_path: str) -> str:
+    """
+    Transcribe audio to English, detect language, and generate structured medical note.
+    """
+    # 1️⃣ Transcribe & Translate
+    transcript_text = "\n".join(transcript_lines(audio_path))
+    print("\n--- Transcript ---\n")
+    print(transcript_text)
+
+    # 2️⃣ Ask llama3
+    answer = generate_note(transcript_text)
     return answer
 
 # --------------------------
 # Example Usage
 # --------------------------
 if __name__ == "__main__":
-    # Optional: Preload llama3 model with a "warm-up" request
-    print("Warming up llama3 model...")
-    warmup = ask_llama("Act as an AI medical scribe")
+    # Optional: Preload Whisper and llama3 before the first request
+    from models import warmup
+    print("Warming up models...")
+    warmup(background=False)
     print("Warm-up complete.")
 
     # Process an audio file
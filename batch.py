@@ -0,0 +1,168 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import cache
+
+AUDIO_EXTS = (".mp3", ".wav", ".m4a", ".ogg", ".flac", ".webm", ".aac", ".opus")
+MANIFEST = "manifest.jsonl"
+
+
+# --------------------------
+# Inputs
+# --------------------------
+def list_inputs(source: str):
+    """
+    A directory is scanned recursively for audio files; any other path is
+    read as a manifest with one audio path per line (or JSONL with "file").
+    """
+    if os.path.isdir(source):
+        files = []
+        for root, _, names in os.walk(source):
+            files += [os.path.join(root, n) for n in names if n.lower().endswith(AUDIO_EXTS)]
+        return sorted(files)
+
+    files = []
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            path = json.loads(line)["file"] if line.startswith("{") else line
+            files.append(path if os.path.isabs(path) else os.path.join(base, path))
+    return files
+
+
+def load_done(out_dir: str):
+    """
+    Files already finished according to the output manifest.
+    """
+    done = set()
+    path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # partial line from a crashed run
+                if rec.get("status") == "done":
+                    done.add(rec["file"])
+    return done
+
+
+def output_name(path: str, base: str) -> str:
+    rel = os.path.relpath(path, base)
+    stem = os.path.splitext(rel)[0].replace(os.sep, "__").replace("..", "_")
+    # Flattening can collide ("a/b.mp3" vs "a__b.mp3"): a hash of the relative path keeps names unique
+    return f"{stem}.{hashlib.sha256(rel.encode('utf-8')).hexdigest()[:8]}"
+
+
+# --------------------------
+# Stages
+# --------------------------
+def _transcribe_worker(path: str):
+    """
+    Runs in a worker process: each process loads its own Whisper model once.
+    """
+    from audio import transcript_lines, audio_duration
+    start = time.time()
+    before = cache.counters()["transcripts"]
+    transcript = "\n".join(transcript_lines(path))
+    cached = cache.counters()["transcripts"]["hits"] > before["hits"]
+    return transcript, audio_duration(path), time.time() - start, cached
+
+
+def _generate(transcript: str):
+    from audio import generate_note
+    start = time.time()
+    note = generate_note(transcript, raise_errors=True)
+    return note, time.time() - start
+
+
+# --------------------------
+# Batch Run
+# --------------------------
+def run_batch(source: str, out_dir: str = "batch_output", workers: int = 2, llm_workers: int = 2):
+    os.makedirs(out_dir, exist_ok=True)
+    files = list_inputs(source)
+    base = source if os.path.isdir(source) else os.path.dirname(os.path.abspath(source))
+    done = load_done(out_dir)
+    todo = [f for f in files if f not in done]
+    print(f"{len(files)} recordings, {len(files) - len(todo)} already done, {len(todo)} to process.")
+    if not todo:
+        return
+
+    manifest = open(os.path.join(out_dir, MANIFEST), "a", encoding="utf-8")
+    manifest_lock = threading.Lock()
+    totals = {"audio": 0.0, "done": 0, "failed": 0, "transcript_hits": 0, "transcripts": 0}
+    notes_before = cache.counters()["notes"]
+
+    def record(rec):
+        with manifest_lock:
+            manifest.write(json.dumps(rec) + "\n")
+            manifest.flush()
+            totals[rec["status"]] += 1
+            totals["audio"] += rec.get("audio_seconds", 0.0)
+            print(f"[{totals['done'] + totals['failed']}/{len(todo)}] {rec['status']}: {rec['file']}")
+
+    def finish(path, transcript, audio_seconds, transcribe_s):
+        try:
+            note, llm_s = _generate(transcript)
+            name = output_name(path, base)
+            with open(os.path.join(out_dir, name + ".transcript.txt"), "w", encoding="utf-8") as f:
+                f.write(transcript)
+            with open(os.path.join(out_dir, name + ".note.txt"), "w", encoding="utf-8") as f:
+                f.write(note)
+            record({"file": path, "status": "done", "note": name + ".note.txt",
+                    "audio_seconds": round(audio_seconds, 2),
+                    "transcribe_s": round(transcribe_s, 2), "llm_s": round(llm_s, 2)})
+        except Exception as e:
+            record({"file": path, "status": "failed", "error": str(e)})
+
+    start = time.time()
+    ctx = multiprocessing.get_context("spawn")   # safe with CUDA in the workers
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as whisper_pool, \
+            ThreadPoolExecutor(max_workers=llm_workers) as llm_pool:
+        futures = {whisper_pool.submit(_transcribe_worker, path): path for path in todo}
+        llm_futures = []
+        # Notes are generated as soon as each transcript is ready
+        for fut in as_completed(futures):
+            path = futures[fut]
+            try:
+                transcript, audio_seconds, transcribe_s, cached = fut.result()
+            except Exception as e:
+                record({"file": path, "status": "failed", "error": str(e)})
+                continue
+            totals["transcripts"] += 1
+            totals["transcript_hits"] += cached
+            llm_futures.append(llm_pool.submit(finish, path, transcript, audio_seconds, transcribe_s))
+        for fut in llm_futures:
+            fut.result()
+    manifest.close()
+
+    wall = time.time() - start
+    print(f"\nDone: {totals['done']} ok, {totals['failed']} failed in {wall:.1f}s")
+    # Transcripts are looked up in the worker processes, notes in this one
+    notes = cache.counters()["notes"]
+    note_hits, note_misses = notes["hits"] - notes_before["hits"], notes["misses"] - notes_before["misses"]
+    print(f"Cache: transcripts {totals['transcript_hits']} hits / {totals['transcripts'] - totals['transcript_hits']} misses, "
+          f"notes {note_hits} hits / {note_misses} misses")
+    if wall > 0:
+        print(f"Throughput: {totals['audio'] / wall:.2f} audio-hours per wall-hour")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcribe and summarize a backlog of recordings.")
+    parser.add_argument("source", help="directory of recordings or a manifest file")
+    parser.add_argument("--out", default="batch_output", help="output directory (holds manifest.jsonl)")
+    parser.add_argument("--workers", type=int, default=2, help="transcription processes")
+    parser.add_argument("--llm-workers", type=int, default=2, help="concurrent llama requests")
+    args = parser.parse_args()
+    run_batch(args.source, args.out, args.workers, args.llm_workers)
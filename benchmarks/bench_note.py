@@ -0,0 +1,99 @@
+"""
+Micro-benchmark for the structured note parser.
+
+    python benchmarks/bench_note.py [--notes 2000] [--repeat 5]
+
+Compares note.parse_note against the original substring-chain stru_pres
+on synthetic llama outputs.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from note import parse_note  # noqa: E402
+
+SECTION_LINES = [
+    "**Chief Complaint:** {s}",
+    "**History of Present Illness:**",
+    "**Relevant Past History:** {s}",
+    "**Symptoms & Examination Findings:**",
+    "**Assessment / Impression:** {s}",
+    "**Plan:**",
+    "SUGGESTED MEDICATIONS with PURPOSE:",
+    "Predicted Medications (with purpose):",
+    "Predicted disease (if confident):",
+]
+WORDS = ("patient reports cough fever pain since three days worse at night no known allergies "
+         "plan review assessment paracetamol 500mg twice daily for fever hydration advised").split()
+
+
+def synthetic_output(rng: random.Random, body_lines: int = 4) -> str:
+    lines = ["Here is the structured note:"]
+    for heading in SECTION_LINES:
+        lines.append(heading.format(s=" ".join(rng.choices(WORDS, k=6))))
+        for _ in range(body_lines):
+            lines.append("- " + " ".join(rng.choices(WORDS, k=rng.randint(5, 15))))
+    return "\n".join(lines)
+
+
+def legacy_stru_pres(raw_text):
+    # The original implementation, kept here as the baseline
+    lines = [line.strip() for line in raw_text.split("\n") if line.strip()]
+    extracted_text = ""
+    for line in lines:
+        lower_line = line.lower()
+        if "chief complaint" in lower_line:
+            extracted_text += f"\n📝 Chief Complaint\n{line.replace('Chief Complaint', '').strip()}\n"
+        elif "history of present illness" in lower_line:
+            extracted_text += f"\n📖 History of Present Illness\n{line.replace('History of Present Illness', '').strip()}\n"
+        elif "relevant past history" in lower_line:
+            extracted_text += f"\n📜 Relevant Past History\n{line.replace('Relevant Past History', '').strip()}\n"
+        elif "symptoms & examination findings" in lower_line:
+            extracted_text += f"\n🔍 Symptoms & Examination Findings\n{line.replace('Symptoms & Examination Findings', '').strip()}\n"
+        elif "assessment" in lower_line:
+            extracted_text += f"\n🩺 Assessment / Impression\n{line.replace('Assessment / Impression', '').strip()}\n"
+        elif "plan" in lower_line:
+            extracted_text += f"\n🧾 Plan\n{line.replace('Plan', '').strip()}\n"
+        elif "suggested medications" in lower_line:
+            extracted_text += "\n💊 Suggested Medications (with purpose)\n"
+        elif "predicted medications" in lower_line:
+            extracted_text += "\n💊 Predicted Medications (with purpose)\n"
+        elif "predicted disease" in lower_line:
+            extracted_text += "\n🩸 Predicted Disease\n"
+        else:
+            extracted_text += line + "\n"
+    return extracted_text
+
+
+def bench(name, fn, outputs, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in outputs:
+            fn(text)
+        best = min(best, time.perf_counter() - start)
+    mb = sum(len(t.encode("utf-8")) for t in outputs) / 1e6
+    print(f"{name:<28} {best * 1000:8.1f} ms  {len(outputs) / best:10.0f} notes/s  {mb / best:7.1f} MB/s")
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--notes", type=int, default=2000)
+    parser.add_argument("--body-lines", type=int, default=20, help="content lines per section")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    outputs = [synthetic_output(rng, args.body_lines) for _ in range(args.notes)]
+    print(f"{args.notes} synthetic notes, {sum(map(len, outputs)) / 1e6:.1f} MB\n")
+
+    bench("legacy stru_pres", legacy_stru_pres, outputs, args.repeat)
+    bench("parse_note", parse_note, outputs, args.repeat)
+    bench("parse_note + to_text", lambda t: parse_note(t).to_text(), outputs, args.repeat)
+    bench("parse_note + to_json", lambda t: parse_note(t).to_json(), outputs, args.repeat)
+    bench("parse_note + to_compact", lambda t: parse_note(t).to_compact(), outputs, args.repeat)
@@ -0,0 +1,277 @@
+"""
+End-to-end pipeline benchmark with a stubbed llama and synthetic audio.
+
+    python benchmarks/bench_pipeline.py                       # run and print
+    python benchmarks/bench_pipeline.py --save-baseline       # record benchmarks/baseline.json
+    python benchmarks/bench_pipeline.py --compare             # fail (exit 1) on regressions
+
+Drives audio.transcript_lines / generate_note / stru_pres and the db module
+against a throwaway database. llama is replaced by StubOllamaClient
+(configurable first-token latency and token rate) and Whisper runs a small
+CPU model, so results depend on this code, not on a GPU or Ollama server.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import struct
+import sys
+import tempfile
+import time
+import wave
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+STUB_NOTE = """**Chief Complaint:** Cough and fever for three days
+**History of Present Illness:**
+Dry cough, worse at night, with fever up to 101F. No breathlessness.
+**Relevant Past History:** None mentioned
+**Symptoms & Examination Findings:**
+Mild throat congestion. Chest clear on auscultation.
+**Assessment / Impression:** Acute upper respiratory tract infection (J06.9)
+**Plan:**
+Rest, fluids, review in five days if not better.
+SUGGESTED MEDICATIONS with PURPOSE:
+- Paracetamol 500 mg - fever
+- Saline gargles - throat irritation
+Predicted disease (if confident):
+Acute upper respiratory infection
+"""
+
+
+# --------------------------
+# Stand-ins
+# --------------------------
+class StubOllamaClient:
+    """
+    Local stand-in for ollama.Client: waits `latency` seconds before the
+    first token, then emits `tokens_per_sec` tokens of a canned note.
+    """
+
+    def __init__(self, latency: float = 0.05, tokens_per_sec: float = 2000.0, note: str = STUB_NOTE):
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.tokens = [note[i:i + 4] for i in range(0, len(note), 4)]  # ~4 chars per token
+
+    def _chunks(self):
+        time.sleep(self.latency)
+        for token in self.tokens:
+            if self.tokens_per_sec:
+                time.sleep(1.0 / self.tokens_per_sec)
+            yield SimpleNamespace(response=token, done=False)
+
+    def generate(self, model=None, prompt="", stream=False, **kwargs):
+        if stream:
+            return self._chunks()
+        return SimpleNamespace(response="".join(c.response for c in self._chunks()), done=True)
+
+
+def synthetic_wav(path: str, seconds: float, rate: int = 16000):
+    """
+    Voiced-like audio: a pitch-modulated tone in syllable-length bursts plus noise.
+    """
+    rng = random.Random(0)
+    frames = bytearray()
+    for i in range(int(seconds * rate)):
+        t = i / rate
+        envelope = 1.0 if (t % 0.6) < 0.4 else 0.05
+        f0 = 140 + 30 * math.sin(2 * math.pi * 3 * t)
+        sample = envelope * (0.5 * math.sin(2 * math.pi * f0 * t) + 0.2 * math.sin(4 * math.pi * f0 * t))
+        sample += rng.uniform(-0.02, 0.02)
+        frames += struct.pack("<h", int(max(-1.0, min(1.0, sample)) * 32767 * 0.6))
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(bytes(frames))
+
+
+# --------------------------
+# Measurement
+# --------------------------
+def percentiles(samples):
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+    return {"p50": pct(50), "p90": pct(90), "p99": pct(99), "mean": statistics.fmean(ordered)}
+
+
+def timed(fn, runs: int):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_transcription(args, tmp):
+    from audio import transcript_lines
+    from models import get_whisper_model
+    path = os.path.join(tmp, "synthetic.wav")
+    synthetic_wav(path, args.audio_seconds)
+    get_whisper_model()  # load outside the timed runs
+    samples = timed(lambda: list(transcript_lines(path)), args.runs)
+    stats = percentiles(samples)
+    return {"transcribe_s": stats, "transcribe_rtf": stats["p50"] / args.audio_seconds}
+
+
+def bench_llm(args):
+    from audio import generate_note_stream, LLM_MODEL
+    transcript = "\n".join(f"[{i * 4}.00s - {i * 4 + 3}.50s] : patient describes cough and fever" for i in range(60))
+    samples, first_token = [], []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        first = None
+        for _note in generate_note_stream(transcript, LLM_MODEL):
+            if first is None:
+                first = time.perf_counter() - start
+        samples.append(time.perf_counter() - start)
+        first_token.append(first)
+    return {"llm_s": percentiles(samples), "llm_first_output_s": percentiles(first_token)}
+
+
+def bench_parse(args):
+    from audio import stru_pres
+    outputs = [STUB_NOTE * args.parse_scale for _ in range(args.parse_notes)]
+    best = min(timed(lambda: [stru_pres(o) for o in outputs], 3))
+    return {"parse_notes_per_s": len(outputs) / best}
+
+
+def bench_db(args):
+    import db
+    db.init_db()
+    ops = {}
+    start = time.perf_counter()
+    pids = [db.insert_patient(f"Patient {i}", f"19{50 + i % 50}-01-01", "F", "O+", "9876500000", None)
+            for i in range(args.db_rows // 10)]
+    ops["db_insert_patient_ops"] = len(pids) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(args.db_rows):
+        db.insert_encounter(1, pids[i % len(pids)], f"2026-01-{1 + i % 28:02d}T10:{i % 60:02d}:00",
+                            STUB_NOTE.replace("three", str(i)))
+    ops["db_insert_encounter_ops"] = args.db_rows / (time.perf_counter() - start)
+
+    n = 200
+    start = time.perf_counter()
+    for i in range(n):
+        db.encounter_page(pids[i % len(pids)], limit=10)
+    ops["db_history_page_ops"] = n / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(n):
+        db.find_patients(f"Patient {i}")
+    ops["db_find_patient_ops"] = n / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(n):
+        db.search_encounters("cough fever", limit=20)
+    ops["db_search_notes_ops"] = n / (time.perf_counter() - start)
+    return ops
+
+
+# --------------------------
+# Baseline comparison
+# --------------------------
+def flatten(results):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat[f"{key}.p50"] = value["p50"]
+        else:
+            flat[key] = value
+    return flat
+
+
+def compare(flat, baseline, tolerance):
+    """
+    Latencies (*_s, *_rtf) must not grow, throughputs (*_ops, *_per_s)
+    must not shrink, by more than tolerance.
+    """
+    failures = []
+    for key, base in baseline.items():
+        if key not in flat or not base:
+            continue
+        value = flat[key]
+        higher_is_better = key.endswith(("_ops", "_per_s"))
+        change = (value - base) / base
+        regressed = change < -tolerance if higher_is_better else change > tolerance
+        mark = "REGRESSION" if regressed else "ok"
+        print(f"  {key:<32} {base:12.4f} -> {value:12.4f}  {change:+7.1%}  {mark}")
+        if regressed:
+            failures.append(key)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--audio-seconds", type=float, default=20.0)
+    parser.add_argument("--whisper-model", default="tiny")
+    parser.add_argument("--skip-audio", action="store_true", help="skip Whisper (no faster-whisper installed)")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="stub seconds to first token")
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=2000.0)
+    parser.add_argument("--parse-notes", type=int, default=2000)
+    parser.add_argument("--parse-scale", type=int, default=5, help="repeat the stub note to make outputs longer")
+    parser.add_argument("--db-rows", type=int, default=5000)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    args = parser.parse_args()
+    # Fail before spending minutes on benchmarks that cannot be compared
+    if args.compare and not args.save_baseline and not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}: run with --save-baseline first.", file=sys.stderr)
+        sys.exit(2)
+
+    tmp = tempfile.mkdtemp(prefix="scribe-bench-")
+    # Configure the pipeline before its modules read the environment
+    os.environ.update({
+        "SCRIBE_CACHE": "0",
+        "SCRIBE_DB_PATH": os.path.join(tmp, "bench.db"),
+        "SCRIBE_WHISPER_MODEL": args.whisper_model,
+        "SCRIBE_WHISPER_DEVICE": "cpu",
+        "SCRIBE_WHISPER_COMPUTE_TYPE": "int8",
+    })
+    from models import set_llm_client
+    set_llm_client(StubOllamaClient(args.llm_latency, args.llm_tokens_per_sec))
+
+    results = {}
+    if not args.skip_audio:
+        results.update(bench_transcription(args, tmp))
+    results.update(bench_llm(args))
+    results.update(bench_parse(args))
+    results.update(bench_db(args))
+
+    print("\n--- Results ---")
+    for key, value in results.items():
+        if isinstance(value, dict):
+            print(f"  {key:<24} " + "  ".join(f"{k}={v * 1000:.1f}ms" for k, v in value.items()))
+        else:
+            print(f"  {key:<24} {value:.3f}")
+
+    flat = flatten(results)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(flat, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+    if args.compare:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n--- Compared with {args.baseline} (tolerance {args.tolerance:.0%}) ---")
+        failures = compare(flat, baseline, args.tolerance)
+        if failures:
+            print(f"\n{len(failures)} regression(s): {', '.join(failures)}")
+            sys.exit(1)
+        print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Local HTTP stand-in for an Ollama server, for exercising llm.LLMPool
+(balancing, failover, keep-alive) without GPUs.
+
+    python benchmarks/stub_ollama_server.py --port 11501 --latency 0.2 &
+    python benchmarks/stub_ollama_server.py --port 11502 --latency 0.2 &
+    SCRIBE_LLM_HOSTS=http://127.0.0.1:11501,http://127.0.0.1:11502 python gradio_ui.py
+
+Answers /api/version, /api/tags and /api/generate (streamed NDJSON or a
+single JSON object) with the canned note from bench_pipeline.py.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_pipeline import STUB_NOTE  # noqa: E402
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    latency = 0.05
+    tokens_per_sec = 2000.0
+    requests = 0
+    _lock = threading.Lock()
+
+    def _json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            self._json({"version": "0.0.0-stub"})
+        elif self.path == "/api/tags":
+            self._json({"models": [{"name": "llama3.1:8b", "model": "llama3.1:8b"}]})
+        else:
+            self._json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self._json({"error": "not found"}, 404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with self._lock:
+            type(self).requests += 1
+        model = request.get("model", "")
+        if not request.get("prompt"):
+            # Empty prompt: Ollama only loads the model
+            self._json({"model": model, "response": "", "done": True})
+            return
+
+        time.sleep(self.latency)
+        tokens = [STUB_NOTE[i:i + 4] for i in range(0, len(STUB_NOTE), 4)]
+        if not request.get("stream", True):
+            time.sleep(len(tokens) / self.tokens_per_sec)
+            self._json({"model": model, "response": STUB_NOTE, "done": True})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for token in tokens:
+            time.sleep(1.0 / self.tokens_per_sec)
+            self.wfile.write(json.dumps({"model": model, "response": token, "done": False}).encode() + b"\n")
+            self.wfile.flush()
+        self.wfile.write(json.dumps({"model": model, "response": "", "done": True}).encode() + b"\n")
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port: int, latency: float = 0.05, tokens_per_sec: float = 2000.0, host: str = "127.0.0.1"):
+    """
+    Start a stand-in server in a daemon thread and return it.
+    """
+    handler = type("Handler", (StubOllamaHandler,), {"latency": latency, "tokens_per_sec": tokens_per_sec})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in Ollama server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=2000.0)
+    args = parser.parse_args()
+    serve(args.port, args.latency, args.tokens_per_sec, args.host)
+    print(f"Stub Ollama on http://{args.host}:{args.port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
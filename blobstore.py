@@ -0,0 +1,141 @@
+import hashlib
+import io
+import os
+import tempfile
+import time
+
+import db
+
+# --------------------------
+# Config (override with environment variables)
+# --------------------------
+BLOB_DIR = os.environ.get("SCRIBE_BLOB_DIR", "blobs")
+PHOTO_MAX_SIDE = int(os.environ.get("SCRIBE_PHOTO_MAX_SIDE", "1600"))  # 0 keeps photos as uploaded
+PHOTO_QUALITY = 85
+GC_GRACE = 3600.0        # unreferenced blobs younger than this may still be mid-upload
+BLOCK_SIZE = 1 << 20
+
+
+def blob_path(digest: str, ext: str = "") -> str:
+    # Two levels of 256 directories keep every directory small
+    return os.path.join(BLOB_DIR, digest[:2], digest[2:4], digest + ext.lower())
+
+
+def _store(tmp_path: str, digest: str, size: int, ext: str) -> str:
+    """
+    Move a fully written temp file to its content address and register it.
+    A duplicate keeps the existing copy and drops the temp file.
+    """
+    dest = blob_path(digest, ext)
+    if os.path.exists(dest):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(tmp_path, dest)
+    if not db.register_blob(dest, digest, size):
+        print(f"Blob store: duplicate of {dest}")
+    return dest
+
+
+def put_file(src_path: str, ext=None) -> str:
+    """
+    Copy a file into the store, hashing it during the copy so it is read
+    only once. Returns the stored path; identical content maps to the same
+    path.
+    """
+    ext = os.path.splitext(src_path)[1] if ext is None else ext
+    os.makedirs(BLOB_DIR, exist_ok=True)
+    h = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=BLOB_DIR, suffix=".part")
+    try:
+        with open(src_path, "rb") as src, os.fdopen(fd, "wb") as out:
+            for block in iter(lambda: src.read(BLOCK_SIZE), b""):
+                h.update(block)
+                out.write(block)
+                size += len(block)
+        return _store(tmp, h.hexdigest(), size, ext)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def put_bytes(data: bytes, ext: str) -> str:
+    os.makedirs(BLOB_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=BLOB_DIR, suffix=".part")
+    with os.fdopen(fd, "wb") as out:
+        out.write(data)
+    return _store(tmp, hashlib.sha256(data).hexdigest(), len(data), ext)
+
+
+def put_photo(src_path: str, max_side: int = PHOTO_MAX_SIDE) -> str:
+    """
+    Store a patient photo, re-encoded as JPEG at most max_side pixels on its
+    longer side when it is larger than that (phone photos are often 4000px+).
+    Smaller photos, and anything PIL cannot open, are stored as uploaded.
+    """
+    if max_side:
+        try:
+            from PIL import Image, ImageOps
+            with Image.open(src_path) as img:
+                if max(img.size) > max_side:
+                    img.draft("RGB", (max_side, max_side))
+                    img = ImageOps.exif_transpose(img).convert("RGB")
+                    img.thumbnail((max_side, max_side))
+                    buf = io.BytesIO()
+                    img.save(buf, "JPEG", quality=PHOTO_QUALITY, optimize=True)
+                    return put_bytes(buf.getvalue(), ".jpg")
+        except ImportError:
+            pass
+        except Exception as e:
+            print(f"Could not downscale {src_path}: {e}")
+    return put_file(src_path)
+
+
+# --------------------------
+# Maintenance
+# --------------------------
+def gc(grace: float = GC_GRACE) -> int:
+    """
+    Delete stored files no Patients/Reports row refers to any more.
+    """
+    removed = 0
+    for path in db.unreferenced_blobs(time.time() - grace):
+        if db.delete_blob(path):
+            if os.path.exists(path):
+                os.remove(path)
+            removed += 1
+    return removed
+
+
+def import_legacy() -> int:
+    """
+    Move photos and reports saved before the blob store into it and point
+    their rows at the stored copies. The old files are left in place.
+    """
+    moved = 0
+    for table, row_id, path in db.legacy_files():
+        if not os.path.exists(path):
+            print(f"Missing {path} ({table} {row_id}), skipped")
+            continue
+        stored = put_file(path)
+        if table == "Patients":
+            db.set_patient_photo(row_id, stored)
+        else:
+            db.set_report_file(row_id, stored)
+        moved += 1
+    return moved
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Patient photo / report blob store maintenance.")
+    parser.add_argument("--import-legacy", action="store_true", help="move files from the old per-upload folders")
+    parser.add_argument("--gc", action="store_true", help="delete unreferenced files")
+    args = parser.parse_args()
+    db.init_db()
+    if args.import_legacy:
+        print(f"Imported {import_legacy()} files into {BLOB_DIR}/")
+    if args.gc:
+        print(f"Removed {gc()} unreferenced files")
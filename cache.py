@@ -0,0 +1,165 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import CACHE_REQUESTS
+
+# --------------------------
+# Config
+# --------------------------
+CACHE_PATH = os.environ.get("SCRIBE_CACHE_PATH", "scribe_cache.db")
+CACHE_ENABLED = os.environ.get("SCRIBE_CACHE", "1") == "1"
+MAX_BYTES = int(os.environ.get("SCRIBE_CACHE_MAX_MB", "256")) * 1024 * 1024
+MAX_AGE = float(os.environ.get("SCRIBE_CACHE_MAX_DAYS", "30")) * 86400
+
+KINDS = ("transcripts", "notes")
+
+_conn = None
+_lock = threading.Lock()
+_stats = {kind: {"hits": 0, "misses": 0} for kind in KINDS}
+
+
+def _db():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+        for kind in KINDS:
+            _conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {kind} (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                size INTEGER,
+                created REAL,
+                last_used REAL
+            )""")
+            _conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{kind}_last_used ON {kind}(last_used)")
+        _conn.commit()
+    return _conn
+
+
+# --------------------------
+# Keys
+# --------------------------
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_key(*parts) -> str:
+    return hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def transcript_key(audio_digest: str, model: str, beam_size: int, task: str) -> str:
+    # audio_digest: file_hash() of the recording
+    return make_key(audio_digest, model, beam_size, task)
+
+
+def note_key(transcript_text: str, model_name: str, prompt_version: str) -> str:
+    return make_key(text_hash(transcript_text), model_name, prompt_version)
+
+
+# --------------------------
+# Get / Put
+# --------------------------
+def get(kind: str, key: str):
+    """
+    Return the cached value or None, counting the hit or miss.
+    """
+    if not CACHE_ENABLED:
+        return None
+    with _lock:
+        conn = _db()
+        row = conn.execute(f"SELECT value, created FROM {kind} WHERE key=?", (key,)).fetchone()
+        now = time.time()
+        if row and now - row[1] <= MAX_AGE:
+            conn.execute(f"UPDATE {kind} SET last_used=? WHERE key=?", (now, key))
+            conn.commit()
+            _stats[kind]["hits"] += 1
+            CACHE_REQUESTS.inc(kind=kind, result="hit")
+            return row[0]
+        _stats[kind]["misses"] += 1
+        CACHE_REQUESTS.inc(kind=kind, result="miss")
+        return None
+
+
+def put(kind: str, key: str, value: str):
+    if not CACHE_ENABLED:
+        return
+    size = len(value.encode("utf-8"))
+    now = time.time()
+    with _lock:
+        conn = _db()
+        conn.execute(f"INSERT OR REPLACE INTO {kind} (key,value,size,created,last_used) VALUES (?,?,?,?,?)",
+                     (key, value, size, now, now))
+        _evict(conn, now)
+        conn.commit()
+
+
+def _evict(conn, now):
+    """
+    Drop entries older than MAX_AGE, then least recently used entries
+    until the cache fits in MAX_BYTES.
+    """
+    for kind in KINDS:
+        conn.execute(f"DELETE FROM {kind} WHERE created < ?", (now - MAX_AGE,))
+
+    total = sum(conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {kind}").fetchone()[0] for kind in KINDS)
+    while total > MAX_BYTES:
+        oldest = min(
+            (conn.execute(f"SELECT last_used, key, size, '{kind}' FROM {kind} ORDER BY last_used LIMIT 1").fetchone()
+             for kind in KINDS),
+            key=lambda r: r[0] if r else float("inf"),
+        )
+        if not oldest:
+            break
+        _, key, size, kind = oldest
+        conn.execute(f"DELETE FROM {kind} WHERE key=?", (key,))
+        total -= size
+
+
+# --------------------------
+# Stats
+# --------------------------
+def counters() -> dict:
+    """
+    Hits and misses of this process's lookups, per kind. Long-running
+    processes export them as scribe_cache_requests_total (metrics.py).
+    """
+    with _lock:
+        return {kind: dict(c) for kind, c in _stats.items()}
+
+
+def stats() -> dict:
+    out = {}
+    with _lock:
+        conn = _db()
+        for kind in KINDS:
+            entries, size = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {kind}").fetchone()
+            out[kind] = dict(_stats[kind], entries=entries, bytes=size)
+    return out
+
+
+def clear():
+    with _lock:
+        conn = _db()
+        for kind in KINDS:
+            conn.execute(f"DELETE FROM {kind}")
+        conn.commit()
+
+
+if __name__ == "__main__":
+    import sys
+    if "--clear" in sys.argv:
+        clear()
+        print("Cache cleared.")
+    for kind, s in stats().items():
+        print(f"{kind}: {s['entries']} entries, {s['bytes'] / 1024:.1f} KiB")
@@ -0,0 +1,82 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import span
+from models import get_whisper_model, WHISPER_NUM_WORKERS
+
+# --------------------------
+# Config
+# --------------------------
+SAMPLE_RATE = 16000
+LONG_AUDIO_SECONDS = float(os.environ.get("SCRIBE_LONG_AUDIO_SECONDS", "600"))  # chunk recordings longer than this
+CHUNK_SECONDS = float(os.environ.get("SCRIBE_CHUNK_SECONDS", "120"))
+CHUNK_WORKERS = int(os.environ.get("SCRIBE_CHUNK_WORKERS", str(WHISPER_NUM_WORKERS)))
+MIN_SILENCE_MS = 500
+
+# Same fields format_segment reads from faster-whisper segments
+Segment = namedtuple("Segment", ["start", "end", "text"])
+
+
+# --------------------------
+# Chunk planning
+# --------------------------
+def plan_chunks(speech, max_samples: int):
+    """
+    Group VAD speech regions ({"start", "end"} in samples, already padded)
+    into chunks of at most max_samples. Chunks only break in the silence
+    between two regions, so no word is cut, and the silence itself is
+    skipped. Returns [(start, end), ...].
+    """
+    chunks = []
+    chunk_start = None
+    prev_end = None
+    for region in speech:
+        if chunk_start is None:
+            chunk_start = region["start"]
+        elif region["end"] - chunk_start > max_samples:
+            chunks.append((chunk_start, prev_end))
+            chunk_start = region["start"]
+        prev_end = region["end"]
+    if chunk_start is not None:
+        chunks.append((chunk_start, prev_end))
+    return chunks
+
+
+# --------------------------
+# Parallel transcription
+# --------------------------
+def transcribe_long(audio, beam_size: int = 5, task: str = "translate", workers: int = CHUNK_WORKERS, model=None):
+    """
+    Split a long recording (a path, or 16 kHz mono samples already decoded)
+    at silences and transcribe the chunks in parallel. Yields Segments in
+    order with timestamps relative to the whole recording.
+    """
+    from faster_whisper.audio import decode_audio
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+    if isinstance(audio, str):
+        with span("audio_decode"):
+            audio = decode_audio(audio, sampling_rate=SAMPLE_RATE)
+    with span("vad"):
+        speech = get_speech_timestamps(
+            audio,
+            VadOptions(min_silence_duration_ms=MIN_SILENCE_MS, max_speech_duration_s=CHUNK_SECONDS),
+            sampling_rate=SAMPLE_RATE,
+        )
+    chunks = plan_chunks(speech, int(CHUNK_SECONDS * SAMPLE_RATE))
+    print(f"Long audio: {len(audio) / SAMPLE_RATE:.0f}s split into {len(chunks)} chunks, {workers} workers")
+
+    model = model or get_whisper_model()
+
+    def run(chunk):
+        start, end = chunk
+        offset = start / SAMPLE_RATE
+        segments, _ = model.transcribe(audio[start:end], beam_size=beam_size, task=task, vad_filter=False)
+        return [Segment(seg.start + offset, seg.end + offset, seg.text) for seg in segments]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # map() returns chunks in order, so segments stream out as soon as
+        # every earlier chunk is done
+        for segments in pool.map(run, chunks):
+            yield from segments
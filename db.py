@@ -0,0 +1,644 @@
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# --------------------------
+# Config
+# --------------------------
+DB_PATH = os.environ.get("SCRIBE_DB_PATH", "medical_scribe.db")
+POOL_SIZE = int(os.environ.get("SCRIBE_DB_POOL_SIZE", "8"))
+SUMMARY_CHARS = 120  # length of per-visit previews in the history list
+BUSY_TIMEOUT = 10.0  # seconds a writer waits for the lock instead of failing with "database is locked"
+
+
+# --------------------------
+# Connection Pool
+# --------------------------
+class ConnectionPool:
+    """
+    Thread-safe pool of SQLite connections in WAL mode. Connections are
+    reused, so sqlite3's per-connection statement cache keeps the queries
+    below prepared across requests.
+    """
+
+    def __init__(self, path: str, size: int = POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT * 1000)}")
+        conn.execute("PRAGMA synchronous=NORMAL")  # safe with WAL, avoids an fsync per commit
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection; commits on success, rolls back on error.
+        """
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._created < self.size
+                if grow:
+                    self._created += 1
+            conn = self._connect() if grow else self._idle.get()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH)
+    return _pool
+
+
+def connection():
+    return get_pool().connection()
+
+
+# --------------------------
+# Schema & Migrations
+# --------------------------
+# Each entry upgrades the schema by one version (tracked in PRAGMA user_version).
+# Never edit a released migration; append a new one instead.
+MIGRATIONS = [
+    # 1: base schema
+    """
+    CREATE TABLE IF NOT EXISTS Doctors (
+        id INTEGER PRIMARY KEY,
+        username TEXT UNIQUE,
+        password_hash TEXT,
+        name TEXT
+    );
+    CREATE TABLE IF NOT EXISTS Patients (
+        id INTEGER PRIMARY KEY,
+        name TEXT,
+        dob TEXT,
+        gender TEXT,
+        blood_group TEXT,
+        contact TEXT,
+        photo_path TEXT
+    );
+    CREATE TABLE IF NOT EXISTS Encounters (
+        id INTEGER PRIMARY KEY,
+        doctor_id INTEGER,
+        patient_id INTEGER,
+        timestamp TEXT,
+        transcript TEXT,
+        FOREIGN KEY (doctor_id) REFERENCES Doctors(id),
+        FOREIGN KEY (patient_id) REFERENCES Patients(id)
+    );
+    CREATE TABLE IF NOT EXISTS Reports (
+        id INTEGER PRIMARY KEY,
+        patient_id INTEGER,
+        file_path TEXT,
+        timestamp TEXT,
+        FOREIGN KEY (patient_id) REFERENCES Patients(id)
+    );
+    """,
+    # 2: indexes for per-patient history and reports
+    """
+    CREATE INDEX IF NOT EXISTS idx_encounters_patient_ts ON Encounters(patient_id, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_reports_patient_ts ON Reports(patient_id, timestamp);
+    """,
+    # 3: full-text search over patient demographics and encounter notes,
+    #    kept in sync with the base tables by triggers
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS PatientsFTS USING fts5(
+        name, dob, contact, content='Patients', content_rowid='id'
+    );
+    CREATE TRIGGER IF NOT EXISTS patients_fts_ai AFTER INSERT ON Patients BEGIN
+        INSERT INTO PatientsFTS(rowid, name, dob, contact) VALUES (new.id, new.name, new.dob, new.contact);
+    END;
+    CREATE TRIGGER IF NOT EXISTS patients_fts_ad AFTER DELETE ON Patients BEGIN
+        INSERT INTO PatientsFTS(PatientsFTS, rowid, name, dob, contact) VALUES ('delete', old.id, old.name, old.dob, old.contact);
+    END;
+    CREATE TRIGGER IF NOT EXISTS patients_fts_au AFTER UPDATE ON Patients BEGIN
+        INSERT INTO PatientsFTS(PatientsFTS, rowid, name, dob, contact) VALUES ('delete', old.id, old.name, old.dob, old.contact);
+        INSERT INTO PatientsFTS(rowid, name, dob, contact) VALUES (new.id, new.name, new.dob, new.contact);
+    END;
+    INSERT INTO PatientsFTS(PatientsFTS) VALUES ('rebuild');
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS EncountersFTS USING fts5(
+        transcript, content='Encounters', content_rowid='id', tokenize='porter unicode61'
+    );
+    CREATE TRIGGER IF NOT EXISTS encounters_fts_ai AFTER INSERT ON Encounters BEGIN
+        INSERT INTO EncountersFTS(rowid, transcript) VALUES (new.id, new.transcript);
+    END;
+    CREATE TRIGGER IF NOT EXISTS encounters_fts_ad AFTER DELETE ON Encounters BEGIN
+        INSERT INTO EncountersFTS(EncountersFTS, rowid, transcript) VALUES ('delete', old.id, old.transcript);
+    END;
+    CREATE TRIGGER IF NOT EXISTS encounters_fts_au AFTER UPDATE OF transcript ON Encounters BEGIN
+        INSERT INTO EncountersFTS(EncountersFTS, rowid, transcript) VALUES ('delete', old.id, old.transcript);
+        INSERT INTO EncountersFTS(rowid, transcript) VALUES (new.id, new.transcript);
+    END;
+    INSERT INTO EncountersFTS(EncountersFTS) VALUES ('rebuild');
+    """,
+    # 4: thumbnail generated at upload time for the report gallery
+    """
+    ALTER TABLE Reports ADD COLUMN thumb_path TEXT;
+    """,
+    # 5: outbound messages, delivered by the outbox worker
+    """
+    CREATE TABLE IF NOT EXISTS Outbox (
+        id INTEGER PRIMARY KEY,
+        encounter_id INTEGER,
+        to_number TEXT,
+        message TEXT,
+        status TEXT DEFAULT 'pending',
+        attempts INTEGER DEFAULT 0,
+        next_attempt REAL,
+        last_error TEXT,
+        created REAL,
+        sent_at REAL,
+        FOREIGN KEY (encounter_id) REFERENCES Encounters(id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_outbox_due ON Outbox(status, next_attempt);
+    CREATE INDEX IF NOT EXISTS idx_outbox_encounter ON Outbox(encounter_id);
+    """,
+    # 6: per-stage pipeline timings (JSON, stage -> seconds) for each encounter
+    """
+    ALTER TABLE Encounters ADD COLUMN timings TEXT;
+    """,
+    # 7: compressed copy of the encounter's recording (see ingest.py)
+    """
+    ALTER TABLE Encounters ADD COLUMN audio_path TEXT;
+    """,
+    # 8: content-addressed files (see blobstore.py), reference-counted by
+    #    triggers on the Patients/Reports rows that point at them
+    """
+    CREATE TABLE IF NOT EXISTS Blobs (
+        path TEXT PRIMARY KEY,
+        digest TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        refcount INTEGER NOT NULL DEFAULT 0,
+        created REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_blobs_refcount ON Blobs(refcount);
+    CREATE TRIGGER IF NOT EXISTS patients_blob_ai AFTER INSERT ON Patients BEGIN
+        UPDATE Blobs SET refcount = refcount + 1 WHERE path = new.photo_path;
+    END;
+    CREATE TRIGGER IF NOT EXISTS patients_blob_ad AFTER DELETE ON Patients BEGIN
+        UPDATE Blobs SET refcount = refcount - 1 WHERE path = old.photo_path;
+    END;
+    CREATE TRIGGER IF NOT EXISTS patients_blob_au AFTER UPDATE OF photo_path ON Patients BEGIN
+        UPDATE Blobs SET refcount = refcount - 1 WHERE path = old.photo_path;
+        UPDATE Blobs SET refcount = refcount + 1 WHERE path = new.photo_path;
+    END;
+    CREATE TRIGGER IF NOT EXISTS reports_blob_ai AFTER INSERT ON Reports BEGIN
+        UPDATE Blobs SET refcount = refcount + 1 WHERE path = new.file_path;
+    END;
+    CREATE TRIGGER IF NOT EXISTS reports_blob_ad AFTER DELETE ON Reports BEGIN
+        UPDATE Blobs SET refcount = refcount - 1 WHERE path = old.file_path;
+    END;
+    CREATE TRIGGER IF NOT EXISTS reports_blob_au AFTER UPDATE OF file_path ON Reports BEGIN
+        UPDATE Blobs SET refcount = refcount - 1 WHERE path = old.file_path;
+        UPDATE Blobs SET refcount = refcount + 1 WHERE path = new.file_path;
+    END;
+    """,
+    # 9: last encounter id written by each incremental export (see export.py)
+    """
+    CREATE TABLE IF NOT EXISTS ExportWatermarks (
+        name TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL,
+        exported_at REAL NOT NULL
+    );
+    """,
+    # 10: named leases, e.g. the one process allowed to send WhatsApp messages (see outbox.py)
+    """
+    CREATE TABLE IF NOT EXISTS Leases (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires REAL NOT NULL
+    );
+    """,
+]
+
+
+def _statements(script: str):
+    """
+    Split a migration into statements (trigger bodies included) so it can
+    run inside an open transaction, which executescript() would commit.
+    """
+    pending = ""
+    for line in script.splitlines(keepends=True):
+        pending += line
+        if sqlite3.complete_statement(pending):
+            yield pending
+            pending = ""
+    if pending.strip():
+        yield pending
+
+
+def init_db():
+    """
+    Create or upgrade the schema to the latest migration.
+    """
+    with connection() as conn:
+        # Several processes may start at once: the version is read only after
+        # taking the write lock, so each migration runs exactly once.
+        conn.isolation_level = None
+        try:
+            while True:
+                conn.execute("BEGIN IMMEDIATE")
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version >= len(MIGRATIONS):
+                    conn.execute("COMMIT")
+                    break
+                for statement in _statements(MIGRATIONS[version]):
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version={version + 1}")
+                conn.execute("COMMIT")
+                print(f"Database migrated to version {version + 1}.")
+        finally:
+            conn.isolation_level = ""
+
+
+# --------------------------
+# Doctors
+# --------------------------
+def insert_doctor(username, password_hash, name):
+    """
+    Raises sqlite3.IntegrityError if the username is taken.
+    """
+    with connection() as conn:
+        conn.execute("INSERT INTO Doctors (username,password_hash,name) VALUES (?,?,?)",
+                     (username, password_hash, name))
+
+
+def get_doctor(username):
+    with connection() as conn:
+        return conn.execute("SELECT id,name,password_hash FROM Doctors WHERE username=?", (username,)).fetchone()
+
+
+# --------------------------
+# Patients
+# --------------------------
+def insert_patient(name, dob, gender, blood_group, contact, photo_path) -> int:
+    with connection() as conn:
+        cur = conn.execute("INSERT INTO Patients (name,dob,gender,blood_group,contact,photo_path) VALUES (?,?,?,?,?,?)",
+                           (name, dob, gender, blood_group, contact, photo_path))
+        return cur.lastrowid
+
+
+def find_patients(q, limit: int = 50, offset: int = 0):
+    """
+    Look up a patient by ID, or rank patients by name / DOB / contact match.
+    """
+    if q is None:
+        return []
+    q = str(q).strip()
+    with connection() as conn:
+        if q.isdigit():
+            return conn.execute("SELECT * FROM Patients WHERE id=?", (int(q),)).fetchall()
+        match = fts_query(q)
+        if not match:
+            return []
+        return conn.execute("""
+            SELECT p.* FROM PatientsFTS f JOIN Patients p ON p.id = f.rowid
+            WHERE PatientsFTS MATCH ? ORDER BY f.rank LIMIT ? OFFSET ?""",
+                            (match, limit, offset)).fetchall()
+
+
+# --------------------------
+# Encounters
+# --------------------------
+def patient_contact(patient_id):
+    with connection() as conn:
+        row = conn.execute("SELECT contact FROM Patients WHERE id=?", (patient_id,)).fetchone()
+        return row[0] if row else None
+
+
+def insert_encounter(doctor_id, patient_id, timestamp, transcript, notify_number=None, timings=None,
+                     audio_path=None) -> int:
+    """
+    Insert an encounter; with notify_number the note is queued in the
+    Outbox in the same transaction, so neither is saved without the other.
+    """
+    with connection() as conn:
+        cur = conn.execute("INSERT INTO Encounters (doctor_id,patient_id,timestamp,transcript,timings,audio_path) "
+                           "VALUES (?,?,?,?,?,?)",
+                           (doctor_id, patient_id, timestamp, transcript, json.dumps(timings) if timings else None,
+                            audio_path))
+        eid = cur.lastrowid
+        if notify_number:
+            now = time.time()
+            conn.execute("INSERT INTO Outbox (encounter_id,to_number,message,status,next_attempt,created) VALUES (?,?,?,'pending',?,?)",
+                         (eid, str(notify_number), transcript, now, now))
+        return eid
+
+
+def encounter_page(patient_id, after=None, limit: int = 10):
+    """
+    One page of a patient's visits, newest first, as
+    (encounter_id, timestamp, summary) rows plus the cursor for the next
+    page (None when there are no more). Uses keyset pagination on
+    (timestamp, id), so deep pages cost the same as the first one, and only
+    reads the start of each note.
+    """
+    sql = f"""
+        SELECT id, timestamp, substr(transcript, 1, {SUMMARY_CHARS * 2})
+        FROM Encounters WHERE patient_id=?"""
+    params = [patient_id]
+    if after:
+        sql += " AND (timestamp, id) < (?, ?)"
+        params += list(after)
+    sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    params.append(limit + 1)
+    with connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+
+    page = [(eid, ts, summarize(text)) for eid, ts, text in rows[:limit]]
+    cursor = (page[-1][1], page[-1][0]) if len(rows) > limit else None
+    return page, cursor
+
+
+def get_encounter(encounter_id):
+    with connection() as conn:
+        return conn.execute("SELECT id, patient_id, doctor_id, timestamp, transcript, audio_path FROM Encounters WHERE id=?",
+                            (encounter_id,)).fetchone()
+
+
+def summarize(note) -> str:
+    """
+    One-line preview of a note: skips the doctor header and emoji headings.
+    """
+    lines = [l.strip() for l in (note or "").split("\n") if l.strip()]
+    body = [l for l in lines if not l.startswith(("🩺 Dr.", "📝", "📖", "📜", "🔍", "🩺", "🧾", "💊", "🩸"))]
+    text = " ".join(body or lines)
+    return text if len(text) <= SUMMARY_CHARS else text[:SUMMARY_CHARS - 1] + "…"
+
+
+def search_encounters(q, since=None, limit: int = 20, offset: int = 0):
+    """
+    Full-text search over encounter notes, best matches first.
+    Returns (rows, has_more); rows are
+    (encounter_id, patient_id, patient_name, timestamp, snippet).
+    """
+    match = fts_query(q)
+    if not match:
+        return [], False
+    sql = """
+        SELECT e.id, e.patient_id, p.name, e.timestamp,
+               snippet(EncountersFTS, 0, '[', ']', '…', 16)
+        FROM EncountersFTS f
+        JOIN Encounters e ON e.id = f.rowid
+        LEFT JOIN Patients p ON p.id = e.patient_id
+        WHERE EncountersFTS MATCH ?"""
+    params = [match]
+    if since:
+        sql += " AND e.timestamp >= ?"
+        params.append(since)
+    sql += " ORDER BY f.rank LIMIT ? OFFSET ?"
+    params += [limit + 1, offset]   # one extra row tells us whether there is a next page
+    with connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    return rows[:limit], len(rows) > limit
+
+
+def fts_query(text: str) -> str:
+    """
+    Turn free text into a safe FTS5 query: every word must match, as a prefix.
+    """
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{w}"*' for w in words)
+
+
+# --------------------------
+# Outbox
+# --------------------------
+def claim_message(now: float):
+    """
+    Mark the oldest due pending message as sending and return
+    (id, to_number, message, attempts), or None.
+    """
+    with connection() as conn:
+        row = conn.execute("""
+            SELECT id, to_number, message, attempts FROM Outbox
+            WHERE status='pending' AND next_attempt <= ? ORDER BY next_attempt LIMIT 1""", (now,)).fetchone()
+        if not row:
+            return None
+        # Guarded update: another process may have claimed it in between
+        cur = conn.execute("UPDATE Outbox SET status='sending' WHERE id=? AND status='pending'", (row[0],))
+        return row if cur.rowcount else None
+
+
+def mark_message_sent(message_id, now: float):
+    with connection() as conn:
+        conn.execute("UPDATE Outbox SET status='sent', attempts=attempts+1, sent_at=?, last_error=NULL WHERE id=?",
+                     (now, message_id))
+
+
+def mark_message_failed(message_id, error: str, next_attempt=None):
+    """
+    Record a failed attempt; retried at next_attempt, or failed for good when None.
+    """
+    status = "pending" if next_attempt is not None else "failed"
+    with connection() as conn:
+        conn.execute("UPDATE Outbox SET status=?, attempts=attempts+1, last_error=?, next_attempt=? WHERE id=?",
+                     (status, error, next_attempt, message_id))
+
+
+def reset_stuck_messages():
+    """
+    Messages left 'sending' by a crashed sender go back to the queue. Only
+    call this while holding the outbox lease.
+    """
+    with connection() as conn:
+        conn.execute("UPDATE Outbox SET status='pending' WHERE status='sending'")
+
+
+def acquire_lease(name, owner, now: float, ttl: float) -> bool:
+    """
+    Take the named lease, or renew it if owner already holds it. True while
+    owner holds it; another owner gets it only after it expires.
+    """
+    with connection() as conn:
+        conn.execute("""
+            INSERT INTO Leases (name, owner, expires) VALUES (?,?,?)
+            ON CONFLICT(name) DO UPDATE SET owner=excluded.owner, expires=excluded.expires
+            WHERE Leases.owner=excluded.owner OR Leases.expires < ?""", (name, owner, now + ttl, now))
+        return conn.execute("SELECT owner FROM Leases WHERE name=?", (name,)).fetchone()[0] == owner
+
+
+def release_lease(name, owner):
+    with connection() as conn:
+        conn.execute("DELETE FROM Leases WHERE name=? AND owner=?", (name, owner))
+
+
+def message_status(encounter_id):
+    """
+    (status, attempts, last_error, sent_at) of the encounter's latest message, or None.
+    """
+    with connection() as conn:
+        return conn.execute("SELECT status, attempts, last_error, sent_at FROM Outbox WHERE encounter_id=? ORDER BY id DESC LIMIT 1",
+                            (encounter_id,)).fetchone()
+
+
+# --------------------------
+# Reports
+# --------------------------
+def insert_report(patient_id, file_path, timestamp, thumb_path=None) -> int:
+    with connection() as conn:
+        cur = conn.execute("INSERT INTO Reports (patient_id, file_path, timestamp, thumb_path) VALUES (?,?,?,?)",
+                           (patient_id, file_path, timestamp, thumb_path))
+        return cur.lastrowid
+
+
+def patient_reports(patient_id):
+    """
+    (report_id, timestamp, file_path, thumb_path) rows, newest first.
+    """
+    with connection() as conn:
+        return conn.execute("SELECT id, timestamp, file_path, thumb_path FROM Reports WHERE patient_id=? ORDER BY timestamp DESC",
+                            (patient_id,)).fetchall()
+
+
+def set_report_thumb(report_id, thumb_path):
+    with connection() as conn:
+        conn.execute("UPDATE Reports SET thumb_path=? WHERE id=?", (thumb_path, report_id))
+
+
+# --------------------------
+# Blobs
+# --------------------------
+def register_blob(path, digest, size) -> bool:
+    """
+    Record a stored file. Returns False if it was already known (a duplicate).
+    References are counted by triggers as Patients/Reports rows point at it.
+    A duplicate's timestamp is refreshed so gc() leaves it alone until the
+    row that re-uses it is saved.
+    """
+    now = time.time()
+    with connection() as conn:
+        # Write lock first: concurrent uploads of the same new file see each other's row
+        conn.execute("BEGIN IMMEDIATE")
+        existed = conn.execute("SELECT 1 FROM Blobs WHERE path=?", (path,)).fetchone() is not None
+        conn.execute("""
+            INSERT INTO Blobs (path, digest, size, refcount, created) VALUES (?,?,?,0,?)
+            ON CONFLICT(path) DO UPDATE SET created=excluded.created""", (path, digest, size, now))
+        return not existed
+
+
+def unreferenced_blobs(older_than):
+    """
+    Paths of blobs no row points at, registered before `older_than` (so
+    uploads still being saved are left alone).
+    """
+    with connection() as conn:
+        return [r[0] for r in conn.execute("SELECT path FROM Blobs WHERE refcount <= 0 AND created < ?",
+                                           (older_than,))]
+
+
+def delete_blob(path) -> bool:
+    """
+    Forget a blob if it is still unreferenced; returns True if removed.
+    """
+    with connection() as conn:
+        return conn.execute("DELETE FROM Blobs WHERE path=? AND refcount <= 0", (path,)).rowcount == 1
+
+
+def legacy_files():
+    """
+    (table, row_id, path) for photos and reports stored before the blob store.
+    """
+    with connection() as conn:
+        return conn.execute("""
+            SELECT 'Patients', id, photo_path FROM Patients
+            WHERE photo_path IS NOT NULL AND photo_path NOT IN (SELECT path FROM Blobs)
+            UNION ALL
+            SELECT 'Reports', id, file_path FROM Reports
+            WHERE file_path NOT IN (SELECT path FROM Blobs)
+        """).fetchall()
+
+
+def set_patient_photo(patient_id, photo_path):
+    with connection() as conn:
+        conn.execute("UPDATE Patients SET photo_path=? WHERE id=?", (photo_path, patient_id))
+
+
+def set_report_file(report_id, file_path):
+    with connection() as conn:
+        conn.execute("UPDATE Reports SET file_path=? WHERE id=?", (file_path, report_id))
+
+
+# --------------------------
+# Export
+# --------------------------
+EXPORT_COLUMNS = ["encounter_id", "timestamp", "doctor_id", "doctor_name", "patient_id", "patient_name",
+                  "dob", "gender", "blood_group", "note", "timings"]
+
+
+def export_chunks(since=None, until=None, doctor_id=None, after_id=0, chunk_rows: int = 1000):
+    """
+    Yield encounters joined with their patient and doctor as lists of at
+    most chunk_rows tuples (EXPORT_COLUMNS), in id order. Rows are fetched
+    from one open cursor, so memory stays flat however large the table;
+    WAL mode lets saves continue meanwhile. `until` is exclusive.
+    """
+    where, params = ["e.id > ?"], [after_id]
+    if since:
+        where.append("e.timestamp >= ?")
+        params.append(since)
+    if until:
+        where.append("e.timestamp < ?")
+        params.append(until)
+    if doctor_id:
+        where.append("e.doctor_id = ?")
+        params.append(doctor_id)
+    sql = f"""
+        SELECT e.id, e.timestamp, e.doctor_id, d.name, e.patient_id, p.name,
+               p.dob, p.gender, p.blood_group, e.transcript, e.timings
+        FROM Encounters e
+        LEFT JOIN Patients p ON p.id = e.patient_id
+        LEFT JOIN Doctors d ON d.id = e.doctor_id
+        WHERE {" AND ".join(where)}
+        ORDER BY e.id
+    """
+    with connection() as conn:
+        cur = conn.execute(sql, params)
+        try:
+            while True:
+                rows = cur.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cur.close()
+
+
+def get_watermark(name) -> int:
+    with connection() as conn:
+        row = conn.execute("SELECT last_id FROM ExportWatermarks WHERE name=?", (name,)).fetchone()
+        return row[0] if row else 0
+
+
+def set_watermark(name, last_id):
+    with connection() as conn:
+        conn.execute("INSERT INTO ExportWatermarks (name, last_id, exported_at) VALUES (?,?,?) "
+                     "ON CONFLICT(name) DO UPDATE SET last_id=excluded.last_id, exported_at=excluded.exported_at",
+                     (name, last_id, time.time()))
@@ -0,0 +1,122 @@
+"""
+Bulk export of encounters (with patient and doctor details) for audits
+and analytics.
+
+    python export.py --format parquet                      # everything
+    python export.py --since 2026-01-01 --until 2026-03-31 --doctor 3
+    python export.py --incremental                         # only rows added since the last --incremental run
+
+Rows stream from SQLite in chunks of --chunk-rows and are appended to the
+output file chunk by chunk, so memory use does not grow with the table.
+"""
+import datetime
+import os
+
+import db
+
+# --------------------------
+# Config
+# --------------------------
+EXPORT_DIR = os.environ.get("SCRIBE_EXPORT_DIR", "exports")
+CHUNK_ROWS = int(os.environ.get("SCRIBE_EXPORT_CHUNK_ROWS", "5000"))
+FORMATS = ("parquet", "csv")
+
+
+def _parquet_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("encounter_id", pa.int64()), ("timestamp", pa.string()),
+        ("doctor_id", pa.int64()), ("doctor_name", pa.string()),
+        ("patient_id", pa.int64()), ("patient_name", pa.string()),
+        ("dob", pa.string()), ("gender", pa.string()), ("blood_group", pa.string()),
+        ("note", pa.string()), ("timings", pa.string()),
+    ])
+
+
+def date_bounds(since=None, until=None):
+    """
+    Turn inclusive YYYY-MM-DD dates into the (since, exclusive until)
+    timestamp strings compared against Encounters.timestamp.
+    """
+    lo = datetime.date.fromisoformat(since).isoformat() if since else None
+    hi = (datetime.date.fromisoformat(until) + datetime.timedelta(days=1)).isoformat() if until else None
+    return lo, hi
+
+
+def export_encounters(fmt: str = "parquet", out_path=None, since=None, until=None, doctor_id=None,
+                      incremental: bool = False, watermark: str = "default", chunk_rows: int = CHUNK_ROWS):
+    """
+    Write matching encounters to out_path and return (path, rows). With
+    incremental=True only encounters after the named watermark are
+    exported, and the watermark moves forward once the file is complete.
+    Returns (None, 0) when there is nothing to export.
+    """
+    import pandas as pd
+
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}")
+    if out_path is None:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        out_path = os.path.join(EXPORT_DIR, f"encounters_{stamp}.{fmt}")
+    since, until = date_bounds(since, until)
+    after_id = db.get_watermark(watermark) if incremental else 0
+
+    # Written under a temporary name so a failed export never looks complete
+    tmp = out_path + ".part"
+    rows, last_id, writer = 0, after_id, None
+    try:
+        for chunk in db.export_chunks(since, until, doctor_id, after_id, chunk_rows):
+            df = pd.DataFrame.from_records(chunk, columns=db.EXPORT_COLUMNS)
+            if fmt == "csv":
+                df.to_csv(tmp, mode="w" if rows == 0 else "a", header=rows == 0, index=False)
+            else:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                schema = _parquet_schema()
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp, schema, compression="zstd")
+                # One row group per chunk
+                writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+            rows += len(chunk)
+            last_id = chunk[-1][0]
+        if writer is not None:
+            writer.close()
+            writer = None
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    if rows == 0:
+        return None, 0
+    os.replace(tmp, out_path)
+    if incremental:
+        db.set_watermark(watermark, last_id)
+    return out_path, rows
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description="Export encounters to Parquet or CSV.")
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--out", help=f"output file (default: {EXPORT_DIR}/encounters_<time>.<format>)")
+    parser.add_argument("--since", help="first visit date, YYYY-MM-DD")
+    parser.add_argument("--until", help="last visit date, YYYY-MM-DD (inclusive)")
+    parser.add_argument("--doctor", type=int, help="doctor id")
+    parser.add_argument("--incremental", action="store_true", help="only encounters added since the last incremental export")
+    parser.add_argument("--watermark", default="default", help="name of the incremental export stream")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    db.init_db()
+    start = time.time()
+    path, n = export_encounters(args.format, args.out, args.since, args.until, args.doctor,
+                                args.incremental, args.watermark, args.chunk_rows)
+    if path:
+        print(f"Exported {n} encounters to {path} in {time.time() - start:.1f}s")
+    else:
+        print("No encounters to export.")
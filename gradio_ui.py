@@ -1,76 +1,48 @@
 import gradio as gr
 import sqlite3
-import shutil
+import db
+import blobstore
 import hashlib
 import datetime
+import difflib
 import os
-from audio import audio_pres   # ✅ your transcription function
-from whatsapp import send_prescription
-
-import base64  # Make sure this import is at the top
+import time
+from jobs import get_queue, QueueFull, FINISHED, FAILED, DRAFT, FINAL
+import outbox
+import metrics
+from models import warmup
+from modelserver import MODEL_SERVER
+from thumbnails import make_thumbnail, THUMB_DIR
+from ingest import ARCHIVE_DIR
+from blobstore import BLOB_DIR
+from export import export_encounters, EXPORT_DIR
 
 # ----------------- CONFIG -----------------
-DB_PATH = "medical_scribe.db"
-contact = 0
-PHOTO_DIR = "patient_photos"
+POLL_INTERVAL = 0.5   # seconds between job status refreshes
+SEARCH_PAGE_SIZE = 20
+HISTORY_PAGE_SIZE = 10
+SEARCH_PERIODS = {"Any time": None, "Last 7 days": 7, "Last 30 days": 30, "Last year": 365}
+PHOTO_DIR = "patient_photos"     # pre-blob-store uploads, still served
+REPORTS_DIR = "patient_reports"
+# Gradio queue: concurrent runs per event (per UI worker process)
+UI_CONCURRENCY = int(os.environ.get("SCRIBE_UI_CONCURRENCY", "8"))        # quick database handlers
+UPLOAD_CONCURRENCY = int(os.environ.get("SCRIBE_UPLOAD_CONCURRENCY", "2"))  # photo/report hashing and thumbnails
+# Outbox workers in several UI processes share a database lease: one sends, the rest stand by
+OUTBOX_WORKER = os.environ.get("SCRIBE_OUTBOX_WORKER", "1") == "1"
 os.makedirs("uploads", exist_ok=True)
 
-# ----------------- DB INIT -----------------
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS Doctors (
-        id INTEGER PRIMARY KEY,
-        username TEXT UNIQUE,
-        password_hash TEXT,
-        name TEXT
-    )""")
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS Patients (
-        id INTEGER PRIMARY KEY,
-        name TEXT,
-        dob TEXT,
-        gender TEXT,
-        blood_group TEXT,
-        contact TEXT,
-        photo_path TEXT
-    )""")
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS Encounters (
-        id INTEGER PRIMARY KEY,
-        doctor_id INTEGER,
-        patient_id INTEGER,
-        timestamp TEXT,
-        transcript TEXT,
-        FOREIGN KEY (doctor_id) REFERENCES Doctors(id),
-        FOREIGN KEY (patient_id) REFERENCES Patients(id)
-    )""")
-    conn.commit()
-    conn.close()
-
 def hash_password(pw):
     return hashlib.sha256(pw.encode()).hexdigest()
 
 def add_doctor(username, password, name):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
     try:
-        cur.execute("INSERT INTO Doctors (username,password_hash,name) VALUES (?,?,?)",
-                    (username, hash_password(password), name))
-        conn.commit()
+        db.insert_doctor(username, hash_password(password), name)
         return "✅ Account created successfully!"
     except sqlite3.IntegrityError:
         return "⚠️ Username already exists."
-    finally:
-        conn.close()
 
 def login_doctor(username, password):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT id,name,password_hash FROM Doctors WHERE username=?", (username,))
-    row = cur.fetchone()
-    conn.close()
+    row = db.get_doctor(username)
     if not row:
         return None, "❌ Doctor not found."
     did, name, pwhash = row
@@ -83,53 +55,65 @@ def add_patient(name, dob, gender, blood_group,contact,photo_path):
     if not (name and gender and dob and contact and blood_group):
         return "⚠️ All fields are required"
 
-    saved_photo_path = None
-    if photo_path:
-        os.makedirs(PHOTO_DIR, exist_ok=True)
-        photo_filename = f"{name}_{int(datetime.datetime.now().timestamp())}.jpg"
-        saved_photo_path = os.path.join(PHOTO_DIR, photo_filename)
-        shutil.copy(photo_path, saved_photo_path)
-
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("INSERT INTO Patients (name,dob,gender,blood_group,contact,photo_path) VALUES (?,?,?,?,?,?)", (name, dob, gender, blood_group, contact, saved_photo_path))
-    conn.commit()
-    pid = cur.lastrowid
-    conn.close()
+    # Stored by content hash; oversized photos are downscaled
+    saved_photo_path = blobstore.put_photo(photo_path) if photo_path else None
+
+    pid = db.insert_patient(name, dob, gender, blood_group, contact, saved_photo_path)
     return f"✅ Patient added with ID: {pid}"
 
 def search_patients(q):
-    global contact_p
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    if str(q).isdigit():
-        cur.execute("SELECT * FROM Patients WHERE id=?", (int(q),))
-    else:
-        cur.execute("SELECT * FROM Patients WHERE name LIKE ? OR dob LIKE ?", (f"%{q}%", f"%{q}%"))
-    rows = cur.fetchall()
-    conn.close()
+    rows = db.find_patients(q)
 
     if not rows:
         return [], gr.update(visible=False)
     
-    contact_p = rows[0][5]
     photo_path = rows[0][6] if rows else None  # 6 = photo_path column
     photo_elem = gr.update(value=photo_path, visible=bool(photo_path))
-    return rows, photo_elem, gr.update(visible=True)
-
-def save_encounter(doctor_id, patient_id, transcript):
-    a=send_prescription(contact_p, transcript)
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("INSERT INTO Encounters (doctor_id,patient_id,timestamp,transcript) VALUES (?,?,?,?)",
-                (doctor_id, patient_id, datetime.datetime.now().isoformat(), transcript))
-    conn.commit()
-    eid = cur.lastrowid
-    conn.close()
-    return eid,a
+    return rows, photo_elem
+
+def save_encounter(doctor_id, patient_id, transcript, timings=None, audio_path=None):
+    # The prescription is queued with the encounter and sent by the outbox worker,
+    # to the number of the patient the encounter is saved for
+    notify_number = db.patient_contact(patient_id)
+    with metrics.span("db_save"):
+        eid = db.insert_encounter(doctor_id, patient_id, datetime.datetime.now().isoformat(), transcript,
+                                  notify_number=notify_number, timings=timings, audio_path=audio_path)
+    metrics.ENCOUNTERS.inc()
+    if not notify_number:
+        return eid, "⚠️ no contact number for this patient, prescription not sent"
+    outbox.notify()
+    return eid, "📨 prescription queued for WhatsApp"
+
+def delivery_status(eid):
+    row = db.message_status(eid)
+    if not row:
+        return f"⚠️ No message queued for encounter {eid}."
+    status, attempts, error, sent_at = row
+    if status == "sent":
+        return f"✅ Prescription for encounter {eid} delivered at {datetime.datetime.fromtimestamp(sent_at):%H:%M:%S}."
+    if status == "failed":
+        return f"❌ Delivery failed after {attempts} attempts: {error}"
+    retry = f" (attempt {attempts} failed: {error}; retrying)" if attempts else ""
+    return f"📨 Prescription for encounter {eid} is {status}{retry}."
+
+def word_diff(old, new):
+    # [(text, "+"/"-"/None), ...] for gr.HighlightedText; words keep their whitespace
+    a, b = old.split(" "), new.split(" ")
+    out = []
+    for op, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if op == "equal":
+            out.append((" ".join(a[i1:i2]) + " ", None))
+            continue
+        if i2 > i1:
+            out.append((" ".join(a[i1:i2]) + " ", "-"))
+        if j2 > j1:
+            out.append((" ".join(b[j1:j2]) + " ", "+"))
+    return out
 
 # ----------------- GRADIO UI -----------------
-init_db()
+db.init_db()
+if OUTBOX_WORKER:
+    outbox.get_worker()
 
 with gr.Blocks(title="AI Medical Scribe") as app:
     gr.Markdown("# 🏥 AI Medical Scribe\nRecord, Transcribe & Generate SOAP Notes")
@@ -175,34 +159,55 @@ with gr.Blocks(title="AI Medical Scribe") as app:
                 label="🎙️ Record or Upload Audio"
             )
             trans_btn = gr.Button("Transcribe & Generate Note")
+            cancel_btn = gr.Button("✖️ Cancel")
+            job_msg = gr.Markdown("")
             transcript_box = gr.Textbox(label="Transcript", lines=6, interactive=True)
+            note_diff = gr.HighlightedText(label="Changes from the draft note", combine_adjacent=True,
+                                           color_map={"+": "green", "-": "red"}, visible=False)
             save_btn = gr.Button("Save Encounter")
             save_msg = gr.Markdown("")
+            delivery_btn = gr.Button("📨 Check Delivery")
 
              # --- View Visit History ---
             view_hist_btn = gr.Button("📜 View Visit History")
-            hist_box = gr.Textbox(label="Visit History", lines=8, interactive=False, visible=False)
-
-            def fetch_history(pid):
+            hist_table = gr.Dataframe(headers=["Encounter ID", "Date", "Summary"], visible=False, interactive=False)
+            hist_more_btn = gr.Button("⬇️ Load More", visible=False)
+            hist_msg = gr.Markdown("")
+            hist_box = gr.Textbox(label="Visit Note", lines=8, interactive=False, visible=False)
+            hist_audio = gr.Audio(label="Visit Recording", type="filepath", interactive=False, visible=False)
+            hist_state = gr.State({"pid": None, "rows": [], "cursor": None})
+
+            def fetch_history(pid, h):
+                # First page of compact per-visit summaries; full notes load on click
                 if not pid:
-                    return gr.update(value="⚠️ Please enter a valid Patient ID.", visible=True)
-                conn = sqlite3.connect(DB_PATH)
-                cur = conn.cursor()
-                cur.execute("SELECT timestamp, transcript FROM Encounters WHERE patient_id=? ORDER BY timestamp DESC", (pid,))
-                rows = cur.fetchall()
-                conn.close()
-
+                    return gr.update(visible=False), gr.update(visible=False), "⚠️ Please enter a valid Patient ID.", gr.update(visible=False), gr.update(visible=False), h
+                rows, cursor = db.encounter_page(pid, limit=HISTORY_PAGE_SIZE)
+                h = {"pid": pid, "rows": rows, "cursor": cursor}
                 if not rows:
-                    return gr.update(value=f"⚠️ No visit history found for Patient ID {pid}.", visible=True)
-        
-                # Format the visit history neatly
-                history_text = f"📋 Visit History for Patient ID {pid}:\n\n"
-                for ts, trans in rows:
-                    history_text += f"🕒 {ts}\n{trans}\n\n---\n\n"
-
-                return gr.update(value=history_text, visible=True)
-
-            view_hist_btn.click(fetch_history, [pid], [hist_box])
+                    return gr.update(visible=False), gr.update(visible=False), f"⚠️ No visit history found for Patient ID {pid}.", gr.update(visible=False), gr.update(visible=False), h
+                return (gr.update(value=rows, visible=True), gr.update(visible=cursor is not None),
+                        f"📋 Visit History for Patient ID {pid} — select a visit to read the full note.",
+                        gr.update(visible=False), gr.update(visible=False), h)
+
+            def more_history(h):
+                if not h["cursor"]:
+                    return gr.update(), gr.update(visible=False), h
+                rows, cursor = db.encounter_page(h["pid"], after=h["cursor"], limit=HISTORY_PAGE_SIZE)
+                h = {"pid": h["pid"], "rows": h["rows"] + rows, "cursor": cursor}
+                return gr.update(value=h["rows"]), gr.update(visible=cursor is not None), h
+
+            def open_visit(h, evt: gr.SelectData):
+                row = h["rows"][evt.index[0]]
+                enc = db.get_encounter(row[0])
+                if not enc:
+                    return gr.update(value="⚠️ Visit not found.", visible=True), gr.update(visible=False)
+                has_audio = bool(enc[5]) and os.path.exists(enc[5])
+                return (gr.update(value=f"🕒 {enc[3]}\n{enc[4]}", visible=True),
+                        gr.update(value=enc[5] if has_audio else None, visible=has_audio))
+
+            view_hist_btn.click(fetch_history, [pid, hist_state], [hist_table, hist_more_btn, hist_msg, hist_box, hist_audio, hist_state])
+            hist_more_btn.click(more_history, [hist_state], [hist_table, hist_more_btn, hist_state])
+            hist_table.select(open_visit, [hist_state], [hist_box, hist_audio])
 
             logout_btn = gr.Button("🚪 Logout")
 
@@ -223,16 +228,57 @@ with gr.Blocks(title="AI Medical Scribe") as app:
                 return msg, s, gr.update(), gr.update(), gr.update()
 
         def process_encounter(audio_path, pid, s):
+            # Generator: submits the encounter to the job queue and streams its progress
+            hide_diff = gr.update(value=None, visible=False)
             if not audio_path:
-                return gr.update(value="⚠️ No audio input found.", interactive=True), s
+                yield gr.update(value="⚠️ No audio input found.", interactive=True), s, "", hide_diff
+                return
 
-            text = audio_pres(audio_path)  # your transcription function
             doc = s.get("doctor")
             dname = doc["name"] if doc else "Unknown"
-            text = f"🩺 Dr. {dname}\n" + text
 
-            s["last"] = {"pid": pid, "trans": text}
-            return gr.update(value=text, interactive=True), s
+            try:
+                job = get_queue().submit(audio_path, {"pid": pid})
+            except QueueFull as e:
+                yield gr.update(interactive=True), s, f"⚠️ Busy: {e}. Please try again shortly.", hide_diff
+                return
+            s["job_id"] = job.id
+
+            text = ""
+            while True:
+                snap = get_queue().status(job.id)
+                if snap["note"]:
+                    text = f"🩺 Dr. {dname}\n" + snap["note"]
+                    shown = text
+                else:
+                    shown = f"🎙️ Transcribing...\n{snap['transcript']}"
+                msg = f"🧾 Job `{job.id}`: {snap['status']}"
+                if "position" in snap:
+                    msg += f" (position {snap['position']} in queue)"
+                if snap["version"] == DRAFT and snap["note"]:
+                    msg += " — 📝 **Draft** (fast model); the final version replaces it when ready"
+                if snap["status"] in FINISHED:
+                    break
+                yield gr.update(value=shown, interactive=False), s, msg, hide_diff
+                time.sleep(POLL_INTERVAL)
+
+            diff = hide_diff
+            if snap["status"] == FAILED:
+                msg += f" ❌ {snap['error']}"
+            elif snap["error"]:
+                msg += f" ⚠️ {snap['error']}"
+            elif snap["version"] == FINAL and snap["draft_note"]:
+                msg += " — ✅ **Final** (refined transcript); changes from the draft are highlighted below"
+                diff = gr.update(value=word_diff(snap["draft_note"], snap["note"]), visible=True)
+            s["job_id"] = None
+            s["last"] = {"pid": pid, "trans": text, "timings": snap["timings"], "audio": snap["audio_archive"]}
+            yield gr.update(value=text, interactive=True), s, msg, diff
+
+        def cancel_encounter(s):
+            job_id = s.get("job_id")
+            if job_id and get_queue().cancel(job_id):
+                return f"✖️ Job `{job_id}` cancelled."
+            return "⚠️ No running job to cancel."
 
         def save_enc(pid, final_text, s):
             doc = s.get("doctor")
@@ -241,14 +287,23 @@ with gr.Blocks(title="AI Medical Scribe") as app:
             if not final_text.strip():
                 return "⚠️ Transcript is empty or not saved yet."
 
-            # Save to database
-            eid, a = save_encounter(doc["id"], pid, final_text)
+            # Save to database, with the pipeline timings and recording of the note it came from
+            last = s.get("last") or {}
+            same = last.get("pid") == pid
+            eid, a = save_encounter(doc["id"], pid, final_text,
+                                    last.get("timings") if same else None, last.get("audio") if same else None)
 
-            # Optionally store in session for WhatsApp sending
-            s["last_saved"] = {"pid": pid, "text": final_text}
+            # Remembered so the doctor can check WhatsApp delivery
+            s["last_saved"] = {"pid": pid, "text": final_text, "eid": eid}
 
             return f"✅ Encounter saved with ID {eid} ({a})"
 
+        def check_delivery(s):
+            last = s.get("last_saved")
+            if not last:
+                return "⚠️ No encounter saved in this session."
+            return delivery_status(last["eid"])
+
         def logout_action(s):
             s["doctor"] = None
             s["last"] = None
@@ -261,8 +316,12 @@ with gr.Blocks(title="AI Medical Scribe") as app:
             [login_msg, state, doctor1, doctor2, doctor_name_md],
         )
 
-        trans_btn.click(process_encounter, [audio_input, pid, state], [transcript_box, state])
+        # The job queue enforces stage limits, so the handler itself is not throttled
+        trans_btn.click(process_encounter, [audio_input, pid, state], [transcript_box, state, job_msg, note_diff],
+                        concurrency_limit=None)
+        cancel_btn.click(cancel_encounter, [state], [job_msg])
         save_btn.click(save_enc, [pid, transcript_box, state], [save_msg])
+        delivery_btn.click(check_delivery, [state], [save_msg])
         logout_btn.click(logout_action, [state], [state, doctor1, doctor2, doctor_name_md])
 
     # ---- Patients ----
@@ -276,7 +335,8 @@ with gr.Blocks(title="AI Medical Scribe") as app:
         p_photo = gr.Image(label="Upload Patient Photo", type="filepath")
         addp_btn = gr.Button("Add Patient")
         addp_msg = gr.Markdown("")
-        addp_btn.click(add_patient, [p_name, p_dob, p_gender,p_blood,p_contact,p_photo], [addp_msg])
+        addp_btn.click(add_patient, [p_name, p_dob, p_gender,p_blood,p_contact,p_photo], [addp_msg],
+                       concurrency_limit=UPLOAD_CONCURRENCY, concurrency_id="uploads")
 
         gr.Markdown("### Search Patients")
         s_query = gr.Textbox(label="Patient ID")
@@ -287,6 +347,68 @@ with gr.Blocks(title="AI Medical Scribe") as app:
 
 
 
+    # ---- Search Notes ----
+    with gr.Tab("🔎 Search Notes"):
+        gr.Markdown("### Search Visit Notes")
+        n_query = gr.Textbox(label="Search", placeholder="e.g. chest pain")
+        n_period = gr.Dropdown(list(SEARCH_PERIODS), value="Any time", label="Visits from")
+        n_btn = gr.Button("Search")
+        n_out = gr.Dataframe(headers=["Encounter ID", "Patient ID", "Name", "Date", "Match"])
+        with gr.Row():
+            n_prev = gr.Button("⬅️ Previous")
+            n_next = gr.Button("Next ➡️")
+        n_msg = gr.Markdown("")
+        n_page = gr.State(0)
+
+        def search_notes(q, period, page):
+            if not q or not q.strip():
+                return [], 0, "⚠️ Enter words to search for."
+            page = max(0, page)
+            days = SEARCH_PERIODS.get(period)
+            since = (datetime.datetime.now() - datetime.timedelta(days=days)).isoformat() if days else None
+            rows, has_more = db.search_encounters(q, since, SEARCH_PAGE_SIZE, page * SEARCH_PAGE_SIZE)
+            if not rows:
+                return [], page, "⚠️ No matching visits." if page == 0 else "⚠️ No more results."
+            first = page * SEARCH_PAGE_SIZE + 1
+            msg = f"Results {first}–{first + len(rows) - 1}" + (" (more on next page)" if has_more else "")
+            return rows, page, msg
+
+        n_btn.click(lambda q, p: search_notes(q, p, 0), [n_query, n_period], [n_out, n_page, n_msg])
+        n_prev.click(lambda q, p, pg: search_notes(q, p, pg - 1), [n_query, n_period, n_page], [n_out, n_page, n_msg])
+        n_next.click(lambda q, p, pg: search_notes(q, p, pg + 1), [n_query, n_period, n_page], [n_out, n_page, n_msg])
+
+    # ---- Export ----
+    with gr.Tab("📤 Export"):
+        gr.Markdown("### Export Encounters for Analytics")
+        x_format = gr.Radio(["parquet", "csv"], value="parquet", label="Format")
+        with gr.Row():
+            x_since = gr.Textbox(label="From (YYYY-MM-DD)")
+            x_until = gr.Textbox(label="To (YYYY-MM-DD)")
+        x_mine = gr.Checkbox(label="Only my encounters")
+        x_incr = gr.Checkbox(label="Only encounters added since my last incremental export")
+        x_btn = gr.Button("Export")
+        x_msg = gr.Markdown("")
+        x_file = gr.File(label="Export File", visible=False)
+
+        def export_action(fmt, since, until, mine, incremental, s):
+            doc = s.get("doctor")
+            if not doc:
+                return "⚠️ Please log in first.", gr.update(visible=False)
+            try:
+                path, n = export_encounters(fmt, since=since.strip() or None, until=until.strip() or None,
+                                            doctor_id=doc["id"] if mine else None, incremental=incremental,
+                                            # one incremental stream per doctor and filter choice
+                                            watermark=f"ui:{doc['id']}:{'mine' if mine else 'all'}")
+            except ValueError as e:
+                return f"⚠️ {e}", gr.update(visible=False)
+            if not path:
+                return "⚠️ No encounters to export.", gr.update(visible=False)
+            return f"✅ Exported {n} encounters.", gr.update(value=path, visible=True)
+
+        # Exports are long-running and I/O heavy: one at a time per worker
+        x_btn.click(export_action, [x_format, x_since, x_until, x_mine, x_incr, state], [x_msg, x_file],
+                    concurrency_limit=1)
+
     # ---- Reports ----
     with gr.Tab("📄 Reports"):
         gr.Markdown("### Upload Patient Scanning Reports")
@@ -303,43 +425,45 @@ with gr.Blocks(title="AI Medical Scribe") as app:
         #view reports
 
         view_btn = gr.Button("👁️ View Reports")
-        report_html = gr.HTML(label="Patient Reports", visible=False)
+        report_gallery = gr.Gallery(label="Patient Reports", visible=False, columns=4, height=500,
+                                    allow_preview=False)
         no_report_msg = gr.Markdown("", visible=False)
+        report_full = gr.Image(label="Full Report", type="filepath", visible=False)
+        report_pdf = gr.File(label="Full Report (PDF)", visible=False)
+        report_state = gr.State([])
 
         def fetch_reports(pid):
+            # Thumbnails are served from disk by Gradio; originals load only on click
             if not pid:
-                return gr.update(visible=False)
+                return gr.update(visible=False), gr.update(visible=False), []
 
-            conn = sqlite3.connect(DB_PATH)
-            cur = conn.cursor()
-            cur.execute("SELECT timestamp, file_path FROM Reports WHERE patient_id=? ORDER BY timestamp DESC", (pid,))
-            rows = cur.fetchall()
-            conn.close()
+            rows = db.patient_reports(pid)
 
             if not rows:
-                return gr.update(visible=False), gr.update(value="⚠️ No reports found for this patient.", visible=True)
-
-            # Build HTML for images with timestamps (base64)
-            html_content = '<div style="display:flex; flex-wrap:wrap; gap:10px; max-height:500px; overflow:auto;">'
-            for ts, fp in rows:
-                ext = os.path.splitext(fp)[1].lower()
-                if ext in [".jpg", ".jpeg", ".png"]:
-                    try:
-                        with open(fp, "rb") as f:
-                            encoded = base64.b64encode(f.read()).decode()
-                        html_content += f'''
-                <div style="text-align:center; width:300px;">  <!-- Bigger container -->
-                    <img src="data:image/{ext[1:]};base64,{encoded}" 
-                         style="max-width:100%; height:auto; border:1px solid #ccc;"/>  <!-- Scales to container -->
-                    <br><small>{ts}</small>
-                </div>
-            '''
-                    except Exception as e:
-                        html_content += f"<div style='color:red;'>Failed to load {fp}: {e}</div>"
-            html_content += '</div>'
-            return gr.update(value=html_content, visible=True),gr.update(visible=False)
-
-        view_btn.click(fetch_reports, [report_pid], [report_html, no_report_msg])
+                return gr.update(visible=False), gr.update(value="⚠️ No reports found for this patient.", visible=True), []
+
+            items, shown = [], []
+            for rid, ts, fp, thumb in rows:
+                if not thumb or not os.path.exists(thumb):
+                    # Reports uploaded before thumbnails existed
+                    thumb = make_thumbnail(fp)
+                    if thumb:
+                        db.set_report_thumb(rid, thumb)
+                if thumb:
+                    items.append((thumb, ts))
+                    shown.append(fp)
+            return gr.update(value=items, visible=True), gr.update(visible=False), shown
+
+        def open_report(shown, evt: gr.SelectData):
+            fp = shown[evt.index]
+            if fp.lower().endswith(".pdf"):
+                return gr.update(visible=False), gr.update(value=fp, visible=True)
+            return gr.update(value=fp, visible=True), gr.update(visible=False)
+
+        # Builds missing thumbnails, so it shares the upload limit
+        view_btn.click(fetch_reports, [report_pid], [report_gallery, no_report_msg, report_state],
+                       concurrency_limit=UPLOAD_CONCURRENCY, concurrency_id="uploads")
+        report_gallery.select(open_report, [report_state], [report_full, report_pdf])
 
 
         #---------------------
@@ -348,39 +472,31 @@ with gr.Blocks(title="AI Medical Scribe") as app:
         upload_btn = gr.Button("Upload Report")
         upload_msg = gr.Markdown("")
     
-        REPORTS_DIR = "patient_reports"
-        os.makedirs(REPORTS_DIR, exist_ok=True)
-    
         def upload_report(pid, file):
             if not pid or not file:
                 return "⚠️ Patient ID and file are required."
         
-            # Save file with patient ID and timestamp
-            filename = f"PID{pid}_{int(datetime.datetime.now().timestamp())}_{os.path.basename(file.name)}"
-            save_path = os.path.join(REPORTS_DIR, filename)
-            shutil.copy(file.name, save_path)
+            # Stored by content hash: re-uploading the same scan reuses the stored copy
+            save_path = blobstore.put_file(file.name)
         
-            # Optionally: Save path in the database if you want
-            conn = sqlite3.connect(DB_PATH)
-            cur = conn.cursor()
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS Reports (
-                    id INTEGER PRIMARY KEY,
-                    patient_id INTEGER,
-                    file_path TEXT,
-                    timestamp TEXT,
-                    FOREIGN KEY (patient_id) REFERENCES Patients(id)
-                )
-                """)
-            cur.execute("INSERT INTO Reports (patient_id, file_path, timestamp) VALUES (?,?,?)",
-                        (pid, save_path, datetime.datetime.now().isoformat()))
-            conn.commit()
-            conn.close()
+            db.insert_report(pid, save_path, datetime.datetime.now().isoformat(), make_thumbnail(save_path))
         
             return f"✅ Report uploaded successfully for Patient ID {pid}!"
     
-        upload_btn.click(upload_report, [report_pid, report_file], [upload_msg])
+        upload_btn.click(upload_report, [report_pid, report_file], [upload_msg],
+                         concurrency_limit=UPLOAD_CONCURRENCY, concurrency_id="uploads")
 
 
 if __name__ == "__main__":
-    app.launch()
+    # Load models in the background so the UI is up immediately
+    # With a model server the models live there, not in the UI workers
+    if os.environ.get("SCRIBE_WARMUP", "1") == "1" and not MODEL_SERVER:
+        warmup()
+    if os.environ.get("SCRIBE_METRICS", "1") == "1":
+        try:
+            metrics.start_server()
+        except OSError as e:
+            # e.g. another UI worker already serves this port; give each its own SCRIBE_METRICS_PORT
+            print(f"Metrics endpoint not started: {e}")
+    app.queue(default_concurrency_limit=UI_CONCURRENCY)
+    app.launch(allowed_paths=[BLOB_DIR, EXPORT_DIR, REPORTS_DIR, THUMB_DIR, PHOTO_DIR, ARCHIVE_DIR])
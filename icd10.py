@@ -0,0 +1,295 @@
+import math
+import os
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from metrics import span
+from note import SECTIONS
+
+# --------------------------
+# Config
+# --------------------------
+BUNDLED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "icd10cm_common.tsv")
+ICD10_PATH = os.environ.get("SCRIBE_ICD10_PATH", BUNDLED_PATH)   # e.g. the CMS icd10cm_codes_<year>.txt
+CHECK_CODES = os.environ.get("SCRIBE_ICD10_CHECK", "1") == "1"
+SUGGEST_MIN_COVERAGE = 0.75   # share of the disease name (by idf) a description must match to be suggested
+SUGGESTION_LABEL = "🔖 Suggested ICD-10-CM:"
+
+_STOPWORDS = {"of", "and", "the", "with", "without", "in", "to", "or", "not", "for", "by", "due", "as", "other",
+              "unspecified", "specified", "elsewhere", "classified", "site", "type", "nos"}
+_WORD = re.compile(r"[a-z0-9]+")
+_CODE = r"[A-Z]\d[0-9A-Z](?:\.?[0-9A-Z]{1,4})?"
+_CODE_FULL = re.compile(_CODE)
+_LABEL = r"ICD-?10(?:-CM)?(?:\s*codes?)?\s*[:\-]?\s*"
+# "(J06.9)", "[ICD-10: J06.9, R50.9]" ...
+_PAREN = re.compile(r"(?P<space>[ \t]?)[(\[](?P<label>(?i:" + _LABEL + r"))?(?P<codes>" + _CODE
+                    + r"(?:\s*[,;/]\s*" + _CODE + r")*)\s*[)\]]")
+# "ICD-10: J06.9" without brackets
+_LABELLED = re.compile(r"(?P<space>[ \t]?)(?P<label>(?i:ICD-?10(?:-CM)?(?:\s*codes?)?\s*[:\-]\s*))(?P<codes>" + _CODE
+                       + r"(?:\s*[,;/]\s*" + _CODE + r")*)")
+_SPLIT = re.compile(r"\s*[,;/]\s*")
+
+
+def normalize(code: str) -> str:
+    return code.replace(".", "").strip().upper()
+
+
+def display(code: str) -> str:
+    return code if len(code) <= 3 else f"{code[:3]}.{code[3:]}"
+
+
+def tokens(text: str):
+    out = []
+    for word in _WORD.findall(text.lower()):
+        if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "is", "us")):
+            word = word[:-1]
+        if word not in _STOPWORDS:
+            out.append(word)
+    return out
+
+
+# --------------------------
+# Index
+# --------------------------
+class ICD10Index:
+    """
+    Codes in a sorted array (bisect for exact and prefix lookups, a few
+    microseconds each) plus an inverted index from description words to
+    codes for matching disease names. A partial index (complete=False, like
+    the bundled subset) cannot tell a wrong code from one it does not list,
+    so it only normalizes codes it knows.
+    """
+
+    def __init__(self, entries, complete: bool = True):
+        self.complete = complete
+        pairs = sorted({normalize(code): desc.strip() for code, desc in entries}.items())
+        self.codes = [code for code, _ in pairs]
+        self.descriptions = [desc for _, desc in pairs]
+        self._terms = [frozenset(tokens(desc)) for desc in self.descriptions]
+        postings = defaultdict(list)
+        for i, terms in enumerate(self._terms):
+            for term in terms:
+                postings[term].append(i)
+        self._postings = dict(postings)
+        n = len(self.codes)
+        self._idf = {term: math.log((n + 1) / len(ids)) + 1.0 for term, ids in self._postings.items()}
+        self._unknown_idf = math.log(n + 1) + 1.0
+
+    @classmethod
+    def load(cls, path: str = ICD10_PATH):
+        """
+        Read "CODE<whitespace>Description" lines: the bundled TSV or the CMS code file.
+        """
+        entries, complete = [], True
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("# subset"):
+                    complete = False
+                elif line and not line.startswith("#"):
+                    code, desc = line.split(None, 1)
+                    entries.append((code, desc))
+        return cls(entries, complete)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def lookup(self, code: str):
+        """
+        Description of a billable code, or None.
+        """
+        code = normalize(code)
+        i = bisect_left(self.codes, code)
+        if i < len(self.codes) and self.codes[i] == code:
+            return self.descriptions[i]
+        return None
+
+    def _prefixed(self, prefix: str) -> range:
+        return range(bisect_left(self.codes, prefix), bisect_left(self.codes, prefix + "\x7f"))
+
+    def has_category(self, code: str) -> bool:
+        """
+        Whether the code's 3-character category has any codes in the index.
+        """
+        return bool(self._prefixed(normalize(code)[:3]))
+
+    def check(self, code: str, context: str = ""):
+        """
+        ("valid", code), ("corrected", code), ("invalid", None), or
+        ("unknown", code) from a partial index. Codes missing their dot are
+        normalized; a category or a code that does not exist is corrected to
+        the best-matching billable code under its closest existing parent
+        (by the words around it).
+        """
+        norm = normalize(code)
+        if self.lookup(norm) is not None:
+            return ("valid" if display(norm) == code else "corrected"), display(norm)
+        if not self.complete:
+            return "unknown", code
+        for k in range(len(norm), 2, -1):
+            candidates = self._prefixed(norm[:k])
+            if candidates:
+                return "corrected", display(self.codes[self._best(candidates, context)])
+        return "invalid", None
+
+    def _best(self, candidates, context: str) -> int:
+        words = set(tokens(context))
+
+        def rank(i):
+            overlap = sum(self._idf.get(t, 0.0) for t in self._terms[i] & words)
+            general = self.codes[i].endswith("9") or "unspecified" in self.descriptions[i].lower()
+            return overlap, general, -len(self.codes[i])
+        return max(candidates, key=rank)
+
+    def search(self, text: str, limit: int = 3):
+        """
+        Codes whose descriptions best cover the words of `text`, as
+        [(code, description, coverage 0..1), ...].
+        """
+        query = set(tokens(text))
+        if not query:
+            return []
+        total = sum(self._idf.get(t, self._unknown_idf) for t in query)
+        scores = defaultdict(float)
+        for term in query:
+            for i in self._postings.get(term, ()):
+                scores[i] += self._idf[term]
+
+        def extra(i):
+            # Description words the query did not ask for: prefer the least specific code
+            return sum(self._idf[t] for t in self._terms[i] - query)
+        ranked = sorted(scores, key=lambda i: (-scores[i], extra(i)))[:limit]
+        return [(display(self.codes[i]), self.descriptions[i], scores[i] / total) for i in ranked]
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_index() -> ICD10Index:
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = ICD10Index.load(ICD10_PATH)
+                print(f"ICD-10-CM index: {len(_index)} codes from {ICD10_PATH}"
+                      + ("" if _index.complete else " (subset: unknown codes are kept)"))
+    return _index
+
+
+def codes_verified() -> bool:
+    """
+    Whether wrong codes in notes get corrected or removed: checking is on
+    and the index is complete (not the bundled subset).
+    """
+    if not CHECK_CODES:
+        return False
+    try:
+        return get_index().complete
+    except OSError:
+        return False
+
+
+# --------------------------
+# Note post-processing
+# --------------------------
+def _review_codes(line: str, index: ICD10Index, report: list) -> str:
+    def fix(m):
+        label = m.group("label") or ""
+        codes = _SPLIT.split(m.group("codes"))
+        # Without an ICD label only tokens in a known category are treated as
+        # codes: "(T2DM)", "(H1N1)" or "(B12)" are clinical text and stay
+        if not label and not any(index.has_category(code) for code in codes):
+            return m.group(0)
+        kept = []
+        for code in codes:
+            if not label and not index.has_category(code):
+                fixed = code
+            else:
+                status, fixed = index.check(code, line)
+                report.append((code, status, fixed))
+            if fixed and fixed not in kept:
+                kept.append(fixed)
+        if not kept:
+            return ""   # every code was invalid: drop the whole reference
+        text = f"{label}{', '.join(kept)}"
+        return m.group("space") + (text if m.re is _LABELLED else f"({text})")
+
+    line = _PAREN.sub(fix, line)
+    return _LABELLED.sub(fix, line)
+
+
+def _suggestion(lines, index: ICD10Index):
+    """
+    (line number to insert at, suggestion line) for the predicted disease,
+    or None if it already has a code or nothing matches well enough.
+    """
+    heading = SECTIONS["predicted_disease"][0]
+    for i, line in enumerate(lines):
+        if line.strip() != heading:
+            continue
+        body = []
+        for j in range(i + 1, len(lines)):
+            if not lines[j].strip():
+                break
+            body.append(lines[j])
+        disease = " ".join(body)
+        if not disease or _CODE_FULL.search(disease) or "not sure" in disease.lower():
+            return None
+        hits = index.search(disease, limit=1)
+        if hits and hits[0][2] >= SUGGEST_MIN_COVERAGE:
+            code, desc, _ = hits[0]
+            return i + 1 + len(body), f"{SUGGESTION_LABEL} {code} – {desc}"
+        return None
+    return None
+
+
+def review_note(note_text: str, index=None):
+    """
+    Check the ICD-10-CM codes in a formatted note against the local index:
+    valid codes stay, fixable ones are corrected, unknown ones are removed,
+    and a code is suggested for the predicted disease. Returns
+    (note_text, [(code, status, replacement), ...]).
+    """
+    index = index or get_index()
+    report = []
+    with span("icd10"):
+        lines = note_text.split("\n")
+        for i, line in enumerate(lines):
+            if line.startswith(SUGGESTION_LABEL):
+                continue
+            if "(" in line or "[" in line or "ICD" in line.upper():
+                lines[i] = _review_codes(line, index, report)
+        if not any(line.startswith(SUGGESTION_LABEL) for line in lines):
+            suggestion = _suggestion(lines, index)
+            if suggestion:
+                lines.insert(*suggestion)
+    return "\n".join(lines), report
+
+
+def review_codes(note_text: str) -> str:
+    """
+    review_note() for the pipeline: returns the note unchanged when
+    checking is disabled (SCRIBE_ICD10_CHECK=0) or the index is unavailable.
+    """
+    if not CHECK_CODES or not note_text:
+        return note_text
+    try:
+        return review_note(note_text)[0]
+    except OSError as e:
+        print(f"ICD-10 check skipped: {e}")
+        return note_text
+
+
+if __name__ == "__main__":
+    import sys
+    index = get_index()
+    for arg in sys.argv[1:]:
+        if _CODE_FULL.fullmatch(arg.upper()):
+            status, code = index.check(arg.upper())
+            print(f"{arg}: {status} {code or ''} {index.lookup(code) if code else ''}")
+        else:
+            for code, desc, coverage in index.search(arg):
+                print(f"{arg}: {code} {desc} ({coverage:.0%})")
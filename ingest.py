@@ -0,0 +1,178 @@
+import os
+from bisect import bisect_right
+
+import cache
+from chunking import SAMPLE_RATE
+from metrics import span
+
+# --------------------------
+# Config (override with environment variables)
+# --------------------------
+TRIM_SILENCE = os.environ.get("SCRIBE_TRIM_SILENCE", "1") == "1"
+FRAME_MS = 30
+TRIM_REL_DB = -35.0      # frames this far below the loud (95th percentile) frames are silence
+TRIM_FLOOR_DB = -60.0    # ...and anything below this always is
+TRIM_PAD_MS = 300        # speech padding kept on both sides
+MAX_GAP_MS = float(os.environ.get("SCRIBE_TRIM_MAX_GAP_MS", "1500"))  # pauses longer than this are shortened...
+KEEP_GAP_MS = 500                                                      # ...to this much silence
+
+ARCHIVE = os.environ.get("SCRIBE_AUDIO_ARCHIVE", "1") == "1"
+ARCHIVE_DIR = os.environ.get("SCRIBE_AUDIO_DIR", "audio_archive")
+ARCHIVE_FORMAT = os.environ.get("SCRIBE_AUDIO_FORMAT", "flac")   # flac (lossless) | opus
+OPUS_BITRATE = 24000
+CODECS = {"flac": ("flac", ".flac"), "opus": ("libopus", ".ogg")}
+
+# Part of the transcript cache key: transcripts change with the trim settings
+TRIM_KEY = f"trim{TRIM_REL_DB:g}/{TRIM_FLOOR_DB:g}/{TRIM_PAD_MS}/{MAX_GAP_MS:g}/{KEEP_GAP_MS}" if TRIM_SILENCE else "notrim"
+
+
+# --------------------------
+# Silence trimming
+# --------------------------
+def speech_frames(audio, sample_rate: int = SAMPLE_RATE):
+    """
+    Boolean mask of FRAME_MS frames that carry speech, by RMS energy
+    relative to the loudest frames, padded by TRIM_PAD_MS on each side.
+    """
+    import numpy as np
+
+    frame = sample_rate * FRAME_MS // 1000
+    n = len(audio) // frame
+    if n == 0:
+        return np.zeros(0, dtype=bool)
+    frames = audio[:n * frame].reshape(n, frame)
+    db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-12)
+    threshold = max(np.percentile(db, 95) + TRIM_REL_DB, TRIM_FLOOR_DB)
+    voiced = db > threshold
+    pad = TRIM_PAD_MS // FRAME_MS
+    return np.convolve(voiced, np.ones(2 * pad + 1), mode="same") > 0
+
+
+def plan_trim(audio, sample_rate: int = SAMPLE_RATE):
+    """
+    Sample ranges [(start, end), ...] to keep: leading and trailing silence
+    dropped, pauses longer than MAX_GAP_MS shortened to KEEP_GAP_MS.
+    Returns the whole recording when no speech is found.
+    """
+    import numpy as np
+
+    frame = sample_rate * FRAME_MS // 1000
+    keep = speech_frames(audio, sample_rate)
+    if len(keep) == 0 or not keep.any():
+        return [(0, len(audio))]
+
+    # Silent runs [start, end) in frames
+    edges = np.diff(np.concatenate(([1], keep.astype(np.int8), [1])))
+    starts, ends = np.flatnonzero(edges == -1), np.flatnonzero(edges == 1)
+    max_gap, keep_gap = int(MAX_GAP_MS // FRAME_MS), int(KEEP_GAP_MS // FRAME_MS)
+    for s, e in zip(starts, ends):
+        if s == 0 or e == len(keep):
+            continue  # leading / trailing silence is dropped
+        keep[s:e if e - s <= max_gap else s + keep_gap] = True
+
+    edges = np.diff(np.concatenate(([0], keep.astype(np.int8), [0])))
+    ranges = [(int(s) * frame, int(e) * frame) for s, e in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))]
+    if ranges[-1][1] == len(keep) * frame:
+        ranges[-1] = (ranges[-1][0], len(audio))  # keep the partial last frame
+    return ranges
+
+
+# --------------------------
+# Recording
+# --------------------------
+class Recording:
+    """
+    An uploaded recording, decoded once to 16 kHz mono float32 and shared
+    by transcription (the trimmed buffer goes straight to faster-whisper)
+    and archiving. Decoding is lazy, so a transcript cache hit reads the
+    file only to hash it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.digest = cache.file_hash(path)
+        self._samples = None
+        self._trimmed = None
+        self._ranges = None
+        self._offsets = None   # start of each kept range within the trimmed audio
+
+    @property
+    def samples(self):
+        if self._samples is None:
+            from faster_whisper.audio import decode_audio
+            with span("audio_decode"):
+                self._samples = decode_audio(self.path, sampling_rate=SAMPLE_RATE)
+        return self._samples
+
+    def trimmed(self):
+        """
+        The audio to transcribe: silence-trimmed unless SCRIBE_TRIM_SILENCE=0.
+        """
+        if self._trimmed is None:
+            import numpy as np
+            audio = self.samples
+            if not TRIM_SILENCE:
+                self._ranges = [(0, len(audio))]
+                self._trimmed = audio
+            else:
+                with span("trim"):
+                    self._ranges = plan_trim(audio)
+                    self._trimmed = np.concatenate([audio[s:e] for s, e in self._ranges])
+                print(f"Trimmed silence: {len(audio) / SAMPLE_RATE:.1f}s -> {len(self._trimmed) / SAMPLE_RATE:.1f}s")
+            self._offsets = []
+            offset = 0
+            for start, end in self._ranges:
+                self._offsets.append(offset)
+                offset += end - start
+        return self._trimmed
+
+    def original_time(self, t: float) -> float:
+        """
+        Map a time in the trimmed audio back to the original recording.
+        """
+        if self._ranges is None:
+            return t
+        pos = t * SAMPLE_RATE
+        i = max(0, bisect_right(self._offsets, pos) - 1)
+        return (self._ranges[i][0] + pos - self._offsets[i]) / SAMPLE_RATE
+
+    def archive_path(self) -> str:
+        ext = CODECS[ARCHIVE_FORMAT][1]
+        return os.path.join(ARCHIVE_DIR, f"{self.digest[:16]}{ext}")
+
+    def archive(self):
+        """
+        Keep a compressed copy of the full (untrimmed) 16 kHz recording for
+        replay and re-processing. Returns its path, or None when disabled.
+        """
+        if not ARCHIVE:
+            return None
+        dest = self.archive_path()
+        if not os.path.exists(dest):
+            os.makedirs(ARCHIVE_DIR, exist_ok=True)
+            tmp = f"{dest}.part{os.path.splitext(dest)[1]}"
+            with span("archive"):
+                encode(self.samples, tmp, ARCHIVE_FORMAT)
+            os.replace(tmp, dest)
+        return dest
+
+
+def encode(samples, dest: str, fmt: str = ARCHIVE_FORMAT):
+    """
+    Write float32 mono samples at SAMPLE_RATE to dest as FLAC or Opus.
+    """
+    import av
+    import numpy as np
+
+    codec = CODECS[fmt][0]
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16).reshape(1, -1)
+    with av.open(dest, "w") as container:
+        stream = container.add_stream(codec, rate=SAMPLE_RATE, layout="mono")
+        if fmt == "opus":
+            stream.bit_rate = OPUS_BITRATE
+        frame = av.AudioFrame.from_ndarray(pcm, format="s16", layout="mono")
+        frame.sample_rate = SAMPLE_RATE
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
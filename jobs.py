@@ -0,0 +1,329 @@
+import itertools
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+
+import metrics
+from models import tiered_enabled
+from modelserver import get_inference
+
+# --------------------------
+# Config
+# --------------------------
+WHISPER_WORKERS = int(os.environ.get("SCRIBE_WHISPER_WORKERS", "1"))
+LLM_WORKERS = int(os.environ.get("SCRIBE_LLM_WORKERS", "1"))
+REFINE_WORKERS = int(os.environ.get("SCRIBE_REFINE_WORKERS", "1"))   # main-model passes in two-tier mode
+MAX_PENDING = int(os.environ.get("SCRIBE_MAX_PENDING", "8"))   # jobs queued or running
+KEEP_FINISHED = 200                                             # finished jobs kept for polling
+
+QUEUED = "queued"
+TRANSCRIBING = "transcribing"
+WAITING_LLM = "waiting for llm"
+GENERATING = "generating"
+REFINING = "draft ready, refining"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Transcript / note versions
+DRAFT = "draft"
+FINAL = "final"
+_DRAFT_PRIORITY, _FINAL_PRIORITY = 0, 1   # drafts go ahead of refinements in the LLM stage
+_TIMESTAMP = re.compile(r"^\[[^\]]*\] : ", re.M)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Cancelled(Exception):
+    pass
+
+
+# --------------------------
+# Job
+# --------------------------
+class Job:
+    def __init__(self, audio_path: str, meta=None):
+        self.id = uuid.uuid4().hex[:8]
+        self.audio_path = audio_path
+        self.meta = meta or {}
+        self.status = QUEUED
+        self.transcript = ""
+        self.note = ""
+        self.error = None
+        self.timings = {}   # stage -> seconds, stored with the encounter
+        self.audio_archive = None   # compressed copy of the recording, stored with the encounter
+        self.version = None         # DRAFT or FINAL: which transcript/note is shown
+        self.draft_transcript = ""  # kept for comparison once the final version replaces it
+        self.draft_note = ""
+        self.refined_transcript = None
+        self._awaiting = 0          # draft note and refined transcript both needed for the final note
+        self.created = time.time()
+        self.finished = None
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise Cancelled()
+
+    def snapshot(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "transcript": self.transcript,
+            "note": self.note,
+            "version": self.version,
+            "draft_note": self.draft_note,
+            "error": self.error,
+            "timings": dict(self.timings),
+            "audio_archive": self.audio_archive,
+            "age": round(time.time() - self.created, 1),
+        }
+
+
+# --------------------------
+# Two-stage pipeline
+# --------------------------
+class EncounterQueue:
+    """
+    Encounter jobs flow through a Whisper stage and an LLM stage, each with
+    its own worker pool, so recording N+1 is transcribed while note N is
+    being generated. Submissions beyond max_pending raise QueueFull.
+
+    In two-tier mode (models.tiered_enabled()) the Whisper stage runs the
+    small draft model, so a draft note is ready within seconds, while
+    refine workers re-transcribe with the main model in the background.
+    The final note is generated from the refined transcript once both are
+    done, behind any waiting drafts, and then replaces the draft.
+    """
+
+    def __init__(self, whisper_workers: int = WHISPER_WORKERS, llm_workers: int = LLM_WORKERS,
+                 max_pending: int = MAX_PENDING, tiered=None, refine_workers: int = REFINE_WORKERS):
+        self.max_pending = max_pending
+        self.tiered = tiered_enabled() if tiered is None else tiered
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._transcribe_q = queue.Queue()
+        self._refine_q = queue.Queue()
+        # Bounded hand-off: Whisper workers stall instead of piling up transcripts
+        self._llm_q = queue.PriorityQueue(maxsize=max(1, llm_workers) * 2)
+        self._seq = itertools.count()
+        self._threads = []
+        for i in range(whisper_workers):
+            self._start(self._whisper_worker, f"whisper-{i}")
+        for i in range(llm_workers):
+            self._start(self._llm_worker, f"llm-{i}")
+        if self.tiered:
+            for i in range(refine_workers):
+                self._start(self._refine_worker, f"refine-{i}")
+
+    def _start(self, target, name):
+        t = threading.Thread(target=target, name=name, daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    # ---- public API ----
+    def submit(self, audio_path: str, meta=None) -> Job:
+        with self._lock:
+            if self.pending() >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} encounters already in progress")
+            job = Job(audio_path, meta)
+            self._jobs[job.id] = job
+            self._prune()
+        self._transcribe_q.put(job)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        snap = job.snapshot()
+        if job.status == QUEUED:
+            snap["position"] = self._position(job)
+        return snap
+
+    def cancel(self, job_id) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.status in FINISHED:
+            return False
+        job._cancel.set()
+        if job.status == QUEUED:
+            self._finish(job, CANCELLED)
+        return True
+
+    def pending(self) -> int:
+        return sum(1 for j in list(self._jobs.values()) if j.status not in FINISHED)
+
+    # ---- internals ----
+    def _position(self, job) -> int:
+        queued = sorted((j for j in list(self._jobs.values()) if j.status == QUEUED), key=lambda j: j.created)
+        return queued.index(job) + 1
+
+    def _prune(self):
+        finished = sorted((j for j in self._jobs.values() if j.status in FINISHED), key=lambda j: j.finished)
+        for j in finished[:max(0, len(finished) - KEEP_FINISHED)]:
+            del self._jobs[j.id]
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        job.finished = time.time()
+
+    def _put_llm(self, job, version, block: bool = True) -> bool:
+        priority = _DRAFT_PRIORITY if version == DRAFT else _FINAL_PRIORITY
+        try:
+            self._llm_q.put((priority, next(self._seq), job, version), block=block)
+            return True
+        except queue.Full:
+            return False
+
+    def _part_done(self, job) -> bool:
+        """
+        Count one of the two inputs of the final note; True for the last one.
+        """
+        with self._lock:
+            job._awaiting -= 1
+            return job._awaiting == 0
+
+    def _whisper_worker(self):
+        while True:
+            job = self._transcribe_q.get()
+            if job.cancelled:
+                continue
+            version = DRAFT if self.tiered else FINAL
+            try:
+                job.status = TRANSCRIBING
+                lines = []
+                out = {}
+                with metrics.collect(job.timings):
+                    for line in get_inference().transcribe(job.audio_path, out, version):
+                        job.check_cancelled()
+                        lines.append(line)
+                        job.transcript = "\n".join(lines)
+                job.audio_archive = out.get("audio_archive")
+                job.version = version
+                if version == DRAFT:
+                    job._awaiting = 2
+                    self._refine_q.put(job)
+                job.status = WAITING_LLM
+                self._put_llm(job, version)
+            except Cancelled:
+                self._finish(job, CANCELLED)
+            except Exception as e:
+                self._finish(job, FAILED, str(e))
+
+    def _refine_worker(self):
+        while True:
+            job = self._refine_q.get()
+            if job.status in FINISHED:
+                continue
+            if job.cancelled:
+                self._finish(job, CANCELLED)
+                continue
+            try:
+                lines = []
+                with metrics.collect(job.timings):
+                    for line in get_inference().transcribe(job.audio_path, {}, FINAL):
+                        job.check_cancelled()
+                        lines.append(line)
+                job.refined_transcript = "\n".join(lines)
+            except Cancelled:
+                self._finish(job, CANCELLED)
+                continue
+            except Exception as e:
+                # The draft stays usable: finish with it rather than failing the encounter
+                job.refined_transcript = e
+            if self._part_done(job):
+                self._start_final(job, block=True)
+
+    def _start_final(self, job, block: bool):
+        """
+        Both the draft note and the refined transcript are ready: queue the
+        final note, or finish with the draft when refinement changed nothing
+        or failed. Returns False if the queue was full and block is False.
+        """
+        refined = job.refined_transcript
+        if isinstance(refined, Exception):
+            self._finish(job, DONE, f"refinement failed, showing the draft: {refined}")
+            return True
+        if _TIMESTAMP.sub("", refined).split() == _TIMESTAMP.sub("", job.transcript).split():
+            job.transcript = refined   # same words, main-model timestamps
+            job.version = FINAL
+            self._finish(job, DONE)
+            return True
+        return self._put_llm(job, FINAL, block)
+
+    def _llm_worker(self):
+        while True:
+            _, _, job, version = self._llm_q.get()
+            if job.cancelled:
+                self._finish(job, CANCELLED)
+                continue
+            try:
+                if version == DRAFT or not self.tiered:
+                    self._note(job)
+                else:
+                    self._final_note(job)
+            except Cancelled:
+                self._finish(job, CANCELLED)
+            except Exception as e:
+                if version == FINAL and self.tiered:
+                    self._finish(job, DONE, f"refinement failed, showing the draft: {e}")
+                else:
+                    self._finish(job, FAILED, str(e))
+
+    def _note(self, job):
+        job.status = GENERATING
+        with metrics.collect(job.timings):
+            for note in get_inference().generate(job.transcript, {}):
+                job.check_cancelled()
+                job.note = note
+        if job.version != DRAFT:
+            self._finish(job, DONE)
+            return
+        job.status = REFINING
+        # Never block on our own queue: write the final note right away if it is full
+        if self._part_done(job) and not self._start_final(job, block=False):
+            self._final_note(job)
+
+    def _final_note(self, job):
+        """
+        Generate the note from the refined transcript without touching the
+        draft being reviewed, then swap both in at once. LLM errors are
+        raised, so a failed final note leaves the draft in place.
+        """
+        note = ""
+        with metrics.collect(job.timings):
+            for note in get_inference().generate(job.refined_transcript, {}, raise_errors=True):
+                job.check_cancelled()
+        job.draft_transcript, job.draft_note = job.transcript, job.note
+        job.transcript, job.note, job.version = job.refined_transcript, note, FINAL
+        self._finish(job, DONE)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue() -> EncounterQueue:
+    """
+    Return the process-wide encounter queue, starting its workers on first use.
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = EncounterQueue()
+    return _queue
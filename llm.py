@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# --------------------------
+# Config (override with environment variables)
+# --------------------------
+LLM_MODEL = os.environ.get("SCRIBE_LLM_MODEL", "llama3.1:8b")
+NUM_CTX = int(os.environ.get("SCRIBE_NUM_CTX", "8192"))  # context window requested from Ollama
+# Comma-separated Ollama servers; requests go to the one with the fewest in flight
+LLM_HOSTS = [h.strip() for h in os.environ.get(
+    "SCRIBE_LLM_HOSTS", os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")).split(",") if h.strip()]
+# How long Ollama keeps the model loaded after a request ("-1" = forever)
+KEEP_ALIVE = os.environ.get("SCRIBE_LLM_KEEP_ALIVE", "30m")
+HEALTH_INTERVAL = float(os.environ.get("SCRIBE_LLM_HEALTH_INTERVAL", "15"))
+HEALTH_TIMEOUT = 2.0
+
+
+def _normalize(host: str) -> str:
+    host = host.rstrip("/")
+    return host if "://" in host else f"http://{host}"
+
+
+def _is_host_error(e: Exception) -> bool:
+    """
+    Failures that another host might not have: connection problems, timeouts
+    and server errors. Bad requests (e.g. unknown model) are raised as is.
+    """
+    status = getattr(e, "status_code", None)
+    if status is not None and status >= 0:
+        return status >= 500
+    return not isinstance(e, (ValueError, TypeError, KeyError))
+
+
+# --------------------------
+# Backends
+# --------------------------
+class Backend:
+    """
+    One Ollama server with its in-flight request count and health.
+    """
+
+    def __init__(self, host: str, client=None):
+        self.host = _normalize(host)
+        self._client = client
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0
+        self.last_error = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import ollama
+            self._client = ollama.Client(host=self.host)
+        return self._client
+
+    def check(self) -> bool:
+        try:
+            with urllib.request.urlopen(f"{self.host}/api/version", timeout=HEALTH_TIMEOUT) as r:
+                ok = r.status == 200
+        except Exception as e:
+            self.last_error = str(e)
+            ok = False
+        if ok and not self.healthy:
+            print(f"LLM host {self.host} is back")
+        self.healthy = ok
+        return ok
+
+
+class LLMPool:
+    """
+    Drop-in for ollama.Client.generate over several Ollama hosts.
+
+    Each request goes to the healthy host with the fewest requests in
+    flight; a host that fails to connect or returns a server error is marked
+    down and the request is retried on the next one. Streams fail over only
+    before their first token, so a note is never duplicated. Down hosts are
+    re-probed in the background and rejoin once they answer.
+    """
+
+    def __init__(self, hosts=None, clients=None, keep_alive=KEEP_ALIVE, health_interval=HEALTH_INTERVAL):
+        hosts = hosts or LLM_HOSTS
+        clients = clients or [None] * len(hosts)
+        self.backends = [Backend(h, c) for h, c in zip(hosts, clients)]
+        self.keep_alive = keep_alive
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if health_interval:
+            threading.Thread(target=self._health_loop, args=(health_interval,),
+                             name="llm-health", daemon=True).start()
+
+    # ---- selection ----
+    def _acquire(self, tried):
+        with self._lock:
+            candidates = [b for b in self.backends if b not in tried]
+            # With every remaining host marked down, still try them rather than fail outright
+            healthy = [b for b in candidates if b.healthy] or candidates
+            if not healthy:
+                return None
+            backend = min(healthy, key=lambda b: b.outstanding)
+            backend.outstanding += 1
+            return backend
+
+    def _release(self, backend, error=None):
+        with self._lock:
+            backend.outstanding -= 1
+            if error is None:
+                backend.failures = 0
+                backend.healthy = True
+            else:
+                backend.failures += 1
+                backend.healthy = False
+                backend.last_error = str(error)
+        if error is not None:
+            print(f"LLM host {backend.host} failed: {error}")
+
+    # ---- requests ----
+    def generate(self, model=None, prompt="", stream=False, **kwargs):
+        kwargs.setdefault("keep_alive", self.keep_alive)
+        if stream:
+            return self._generate_stream(model, prompt, kwargs)
+        tried = []
+        while True:
+            backend = self._acquire(tried)
+            if backend is None:
+                raise ConnectionError(f"No LLM host could serve the request: {tried[-1].last_error}")
+            tried.append(backend)
+            try:
+                response = backend.client.generate(model=model, prompt=prompt, stream=False, **kwargs)
+            except Exception as e:
+                if not _is_host_error(e):
+                    self._release(backend)
+                    raise
+                self._release(backend, e)
+                continue
+            self._release(backend)
+            return response
+
+    def _generate_stream(self, model, prompt, kwargs):
+        tried = []
+        while True:
+            backend = self._acquire(tried)
+            if backend is None:
+                raise ConnectionError(f"No LLM host could serve the request: {tried[-1].last_error}")
+            tried.append(backend)
+            started = False
+            try:
+                for chunk in backend.client.generate(model=model, prompt=prompt, stream=True, **kwargs):
+                    started = True
+                    yield chunk
+            except GeneratorExit:
+                self._release(backend)
+                raise
+            except Exception as e:
+                if started or not _is_host_error(e):
+                    self._release(backend, e if _is_host_error(e) else None)
+                    raise
+                self._release(backend, e)
+                continue
+            self._release(backend)
+            return
+
+    # ---- health / warm-up ----
+    def _health_loop(self, interval):
+        while not self._stop.wait(interval):
+            for backend in self.backends:
+                if not backend.healthy:
+                    backend.check()
+
+    def close(self):
+        self._stop.set()
+
+    def warmup(self, model=LLM_MODEL, options=None):
+        """
+        Load the model on every host (an empty prompt only loads it) and pin
+        it with keep_alive, so the first encounter does not pay the load.
+        Uses the same num_ctx as real requests: a different one forces a reload.
+        """
+        options = options or {"num_ctx": NUM_CTX}
+
+        def load(backend):
+            start = time.time()
+            try:
+                backend.client.generate(model=model, prompt="", keep_alive=self.keep_alive, options=options)
+                print(f"llama '{model}' ready on {backend.host} in {time.time() - start:.1f}s")
+            except Exception as e:
+                with self._lock:
+                    backend.healthy = False
+                    backend.last_error = str(e)
+                print(f"llama warm-up failed on {backend.host}: {e}")
+
+        with ThreadPoolExecutor(max_workers=len(self.backends)) as pool:
+            list(pool.map(load, self.backends))
+
+    def status(self):
+        with self._lock:
+            return [{"host": b.host, "healthy": b.healthy, "outstanding": b.outstanding,
+                     "failures": b.failures, "last_error": b.last_error} for b in self.backends]
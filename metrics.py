@@ -0,0 +1,179 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --------------------------
+# Config
+# --------------------------
+METRICS_HOST = os.environ.get("SCRIBE_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("SCRIBE_METRICS_PORT", "9464"))
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+# --------------------------
+# Metric types
+# --------------------------
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labels, key)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}   # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            row = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        names = self.labels + ("le",)
+        for key, row in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, row):
+                yield f"{self.name}_bucket{_labels(names, key + (bound,))} {count}"
+            yield f"{self.name}_bucket{_labels(names, key + ('+Inf',))} {row[-1]}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {row[-2]}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {row[-1]}"
+
+
+REGISTRY = []
+
+
+def counter(name, help, labels=()):
+    metric = Counter(name, help, labels)
+    REGISTRY.append(metric)
+    return metric
+
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    metric = Histogram(name, help, labels, buckets)
+    REGISTRY.append(metric)
+    return metric
+
+
+def render() -> str:
+    """
+    All metrics in Prometheus text exposition format.
+    """
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# --------------------------
+# Pipeline metrics
+# --------------------------
+STAGE_SECONDS = histogram("scribe_stage_seconds", "Time spent in each pipeline stage", ["stage"])
+STAGE_ERRORS = counter("scribe_stage_errors_total", "Pipeline stage failures", ["stage"])
+CACHE_REQUESTS = counter("scribe_cache_requests_total", "Transcript/note cache lookups", ["kind", "result"])
+ENCOUNTERS = counter("scribe_encounters_saved_total", "Encounters saved")
+
+# Per-encounter timings collected by the spans running in the current context
+_timings = contextvars.ContextVar("scribe_timings", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Time a block: observed in scribe_stage_seconds, counted as an error if it
+    raises, and added to the current encounter's timings (see collect()). A
+    stream closed early (cancelled job, dropped connection) is not an error.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except GeneratorExit:
+        raise
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _timings.get()
+        if timings is not None:
+            timings[stage] = round(timings.get(stage, 0.0) + elapsed, 4)
+
+
+def add_timings(timings: dict):
+    """
+    Add stage timings measured elsewhere (e.g. by the model server) to the
+    current encounter's timings.
+    """
+    current = _timings.get()
+    if current is not None:
+        for stage, seconds in timings.items():
+            current[stage] = round(current.get(stage, 0.0) + seconds, 4)
+
+
+@contextmanager
+def collect(timings=None):
+    """
+    Gather span timings of the enclosed work into a dict (stage -> seconds).
+    """
+    timings = {} if timings is None else timings
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+# --------------------------
+# HTTP endpoint
+# --------------------------
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # keep scrapes out of the console
+
+
+def start_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """
+    Serve /metrics from a daemon thread.
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"Metrics on http://{host}:{port}/metrics")
+    return server
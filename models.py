@@ -0,0 +1,172 @@
+import os
+import threading
+
+# --------------------------
+# Environment Setup
+# --------------------------
+os.environ.setdefault("HF_HUB_DISABLE_SYMLINKS_WARNING", "1")
+os.environ.setdefault("HF_HUB_DISABLE_SYMLINKS", "1")
+
+# --------------------------
+# Config (override with environment variables)
+# --------------------------
+# Model size used on GPU nodes. Leave SCRIBE_WHISPER_MODEL unset to pick
+# the size from the device ("large" on CUDA, SCRIBE_WHISPER_CPU_MODEL on CPU).
+WHISPER_MODEL = os.environ.get("SCRIBE_WHISPER_MODEL")
+WHISPER_GPU_MODEL = "large"
+WHISPER_CPU_MODEL = os.environ.get("SCRIBE_WHISPER_CPU_MODEL", "base")
+WHISPER_DEVICE = os.environ.get("SCRIBE_WHISPER_DEVICE", "auto")              # auto | cuda | cpu
+WHISPER_COMPUTE_TYPE = os.environ.get("SCRIBE_WHISPER_COMPUTE_TYPE", "auto")  # auto | float16 | int8 | ...
+# Two-tier mode: a small model with greedy decoding gives a draft within
+# seconds while the main model refines it. "auto" enables it whenever the
+# main model is a different (larger) size than the draft model.
+WHISPER_DRAFT_MODEL = os.environ.get("SCRIBE_WHISPER_DRAFT_MODEL", "base")
+TIERED = os.environ.get("SCRIBE_TIERED", "auto")   # auto | 1 | 0
+# Parallel decodes one model instance can run (used by long-audio chunking)
+WHISPER_NUM_WORKERS = int(os.environ.get("SCRIBE_WHISPER_NUM_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+
+# --------------------------
+# Registry
+# --------------------------
+_whisper_models = {}
+_whisper_configs = {}   # requested (size, device, compute_type) -> the config actually loaded
+_llm_client = None
+_lock = threading.RLock()
+
+
+def cuda_available() -> bool:
+    try:
+        import ctranslate2
+        return ctranslate2.get_cuda_device_count() > 0
+    except Exception:
+        return False
+
+
+def resolve_whisper_config(size=None, device=None, compute_type=None):
+    """
+    Fill in (size, device, compute_type) from arguments, environment and hardware.
+    """
+    device = device or WHISPER_DEVICE
+    if device == "auto":
+        device = "cuda" if cuda_available() else "cpu"
+
+    compute_type = compute_type or WHISPER_COMPUTE_TYPE
+    if compute_type == "auto":
+        compute_type = "float16" if device == "cuda" else "int8"
+
+    size = size or WHISPER_MODEL or (WHISPER_GPU_MODEL if device == "cuda" else WHISPER_CPU_MODEL)
+    return size, device, compute_type
+
+
+def tiered_enabled() -> bool:
+    if TIERED in ("0", "1"):
+        return TIERED == "1"
+    return resolve_whisper_config()[0] != resolve_whisper_config(WHISPER_DRAFT_MODEL)[0]
+
+
+def whisper_config(size=None, device=None, compute_type=None):
+    """
+    The (size, device, compute_type) that serves these arguments: the CPU
+    fallback's once a GPU load has failed, otherwise the requested config.
+    """
+    key = resolve_whisper_config(size, device, compute_type)
+    return _whisper_configs.get(key, key)
+
+
+def get_whisper_model(size=None, device=None, compute_type=None):
+    """
+    Return a loaded WhisperModel, loading it on first use.
+    Instances are cached by (size, device, compute_type).
+    """
+    key = resolve_whisper_config(size, device, compute_type)
+    model = _whisper_models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _whisper_models.get(key)
+        if model is not None:
+            return model
+
+        from faster_whisper import WhisperModel
+
+        size, device, compute_type = key
+        print(f"Loading Whisper model '{size}' on {device} ({compute_type})...")
+        # On CPU, share the cores between the parallel workers
+        cpu_threads = max(1, (os.cpu_count() or 1) // WHISPER_NUM_WORKERS) if device == "cpu" else 0
+        try:
+            model = WhisperModel(size, device=device, compute_type=compute_type,
+                                 num_workers=WHISPER_NUM_WORKERS, cpu_threads=cpu_threads)
+            _whisper_configs[key] = key
+        except Exception as e:
+            if device == "cpu":
+                raise
+            # GPU missing or out of memory: fall back to a small int8 model on CPU
+            print(f"Could not load Whisper on {device}: {e}. Falling back to CPU int8.")
+            fallback = (WHISPER_MODEL or WHISPER_CPU_MODEL, "cpu", "int8")
+            model = get_whisper_model(*fallback)
+            _whisper_configs[key] = whisper_config(*fallback)
+        _whisper_models[key] = model
+        print("Whisper model loaded.")
+        return model
+
+
+def get_llm_client():
+    """
+    Return the shared llama client, creating it on first use: an LLMPool
+    over the Ollama hosts in SCRIBE_LLM_HOSTS (see llm.py).
+    """
+    global _llm_client
+    if _llm_client is None:
+        with _lock:
+            if _llm_client is None:
+                from llm import LLMPool, LLM_HOSTS
+                print(f"Initializing llama client ({', '.join(LLM_HOSTS)})...")
+                _llm_client = LLMPool(LLM_HOSTS)
+    return _llm_client
+
+
+def set_llm_client(client):
+    """
+    Replace the llama client, e.g. with a local stand-in for benchmarks.
+    """
+    global _llm_client
+    _llm_client = client
+
+
+def loaded_models():
+    return list(_whisper_models)
+
+
+# --------------------------
+# Warm-up
+# --------------------------
+def warmup(size=None, device=None, compute_type=None, background: bool = True):
+    """
+    Load the Whisper model and the llama model ahead of the first request.
+    Both load in parallel daemon threads by default so they never block app start.
+    """
+    def _whisper():
+        try:
+            if tiered_enabled():
+                get_whisper_model(WHISPER_DRAFT_MODEL, device, compute_type)
+            get_whisper_model(size, device, compute_type)
+        except Exception as e:
+            print(f"Whisper warm-up failed: {e}")
+
+    def _llm():
+        try:
+            client = get_llm_client()
+            if hasattr(client, "warmup"):  # stand-in clients have nothing to load
+                client.warmup()
+        except Exception as e:
+            print(f"llama warm-up failed: {e}")
+
+    if not background:
+        _whisper()
+        _llm()
+        return None
+    threads = [threading.Thread(target=fn, name=f"warmup-{fn.__name__[1:]}", daemon=True) for fn in (_whisper, _llm)]
+    for thread in threads:
+        thread.start()
+    return threads
@@ -0,0 +1,221 @@
+"""
+Shared inference process for several UI workers on one node.
+
+    python modelserver.py                                  # loads Whisper + llama once
+    SCRIBE_MODEL_SERVER=127.0.0.1:6010 python gradio_ui.py # each UI worker
+
+UI workers send requests over multiprocessing.connection (authenticated
+with a shared key) and receive transcript lines and note drafts as they are
+produced, so GPU memory holds one copy of each model however many UI
+processes run. Without SCRIBE_MODEL_SERVER the UI runs inference in-process.
+"""
+import os
+import secrets
+import threading
+from collections import OrderedDict
+from multiprocessing.connection import Client, Listener, AuthenticationError
+
+import metrics
+
+# --------------------------
+# Config (override with environment variables)
+# --------------------------
+MODEL_SERVER = os.environ.get("SCRIBE_MODEL_SERVER", "")   # host:port or a unix socket path
+DEFAULT_ADDRESS = "127.0.0.1:6010"
+KEY_FILE = os.environ.get("SCRIBE_MODEL_SERVER_KEYFILE", ".model_server.key")
+WHISPER_SLOTS = int(os.environ.get("SCRIBE_WHISPER_WORKERS", "1"))   # concurrent transcriptions
+LLM_SLOTS = int(os.environ.get("SCRIBE_LLM_WORKERS", "1"))           # concurrent note generations
+KEEP_RECORDINGS = 4   # decoded drafts kept for their refinement pass (two-tier mode)
+
+
+class RemoteError(Exception):
+    pass
+
+
+def parse_address(address: str):
+    if ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        return host or "127.0.0.1", int(port)
+    return address
+
+
+def load_authkey(create: bool = False) -> bytes:
+    """
+    SCRIBE_MODEL_SERVER_KEY, or the key file the server writes on first
+    start (readable only by its owner). Requests are pickled, so the key is
+    what keeps other local users from talking to the server.
+    """
+    key = os.environ.get("SCRIBE_MODEL_SERVER_KEY")
+    if key:
+        return key.encode("utf-8")
+    if create and not os.path.exists(KEY_FILE):
+        fd = os.open(KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+    with open(KEY_FILE, encoding="utf-8") as f:
+        return f.read().strip().encode("utf-8")
+
+
+# --------------------------
+# Inference backends
+# --------------------------
+class LocalInference:
+    """
+    Runs Whisper and llama in this process.
+    """
+
+    def __init__(self):
+        # Recordings decoded for a draft, reused by the refinement pass so
+        # the upload is hashed and decoded only once
+        self._recordings = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recording(self, audio_path: str):
+        from ingest import Recording
+        st = os.stat(audio_path)
+        key = (os.path.abspath(audio_path), st.st_mtime_ns, st.st_size)
+        with self._lock:
+            rec = self._recordings.pop(key, None)
+        return key, rec or Recording(audio_path)
+
+    def transcribe(self, audio_path: str, out: dict, tier: str = "final"):
+        """
+        Yields transcript lines; sets out["audio_archive"] when done.
+        """
+        from audio import transcript_lines
+        key, rec = self._recording(audio_path)
+        yield from transcript_lines(rec, tier)
+        try:
+            # Reuses the samples decoded for Whisper
+            out["audio_archive"] = rec.archive()
+        except Exception as e:
+            print(f"Could not archive {audio_path}: {e}")
+        if tier == "draft":
+            with self._lock:
+                self._recordings[key] = rec
+                while len(self._recordings) > KEEP_RECORDINGS:
+                    self._recordings.popitem(last=False)
+
+    def generate(self, transcript: str, out: dict, raise_errors: bool = False):
+        """
+        Yields the note as it is generated. LLM errors are appended to the
+        note unless raise_errors is set.
+        """
+        from audio import generate_note_stream
+        yield from generate_note_stream(transcript, raise_errors=raise_errors)
+
+
+class RemoteInference:
+    """
+    Same interface as LocalInference, served by a ModelServer. Each call
+    uses its own connection, so abandoning a stream (e.g. a cancelled job)
+    just closes it and the server stops working on it.
+    """
+
+    def __init__(self, address: str = MODEL_SERVER, authkey=None):
+        self.address = parse_address(address)
+        self.authkey = authkey or load_authkey()
+
+    def _call(self, method: str, out: dict, **kwargs):
+        conn = Client(self.address, authkey=self.authkey)
+        try:
+            conn.send((method, kwargs))
+            while True:
+                kind, value = conn.recv()
+                if kind == "item":
+                    yield value
+                elif kind == "end":
+                    # Stage timings measured by the server count for this job
+                    metrics.add_timings(value.pop("timings", {}))
+                    out.update(value)
+                    return
+                else:
+                    raise RemoteError(value)
+        finally:
+            conn.close()
+
+    def transcribe(self, audio_path: str, out: dict, tier: str = "final"):
+        # The server reads the file itself: it runs on the same node
+        yield from self._call("transcribe", out, audio_path=os.path.abspath(audio_path), tier=tier)
+
+    def generate(self, transcript: str, out: dict, raise_errors: bool = False):
+        yield from self._call("generate", out, transcript=transcript, raise_errors=raise_errors)
+
+
+_inference = None
+
+
+def get_inference():
+    """
+    The process-wide inference backend: remote when SCRIBE_MODEL_SERVER is set.
+    """
+    global _inference
+    if _inference is None:
+        _inference = RemoteInference(MODEL_SERVER) if MODEL_SERVER else LocalInference()
+    return _inference
+
+
+# --------------------------
+# Server
+# --------------------------
+class ModelServer:
+    """
+    Serves LocalInference to UI workers, one thread per request. Stage
+    semaphores cap concurrent transcriptions and generations across all
+    workers, like the per-process job queue does for a single worker.
+    """
+
+    def __init__(self, address: str = DEFAULT_ADDRESS, authkey=None,
+                 whisper_slots: int = WHISPER_SLOTS, llm_slots: int = LLM_SLOTS):
+        self.address = parse_address(address)
+        self.authkey = authkey or load_authkey(create=True)
+        self.local = LocalInference()
+        # Drafts get their own slots so they never wait behind a slow refinement
+        self.slots = {"transcribe/final": threading.Semaphore(whisper_slots),
+                      "transcribe/draft": threading.Semaphore(whisper_slots),
+                      "generate": threading.Semaphore(llm_slots)}
+
+    def _handle(self, conn):
+        try:
+            method, kwargs = conn.recv()
+            slot = f"transcribe/{kwargs.get('tier', 'final')}" if method == "transcribe" else method
+            if slot not in self.slots:
+                conn.send(("error", f"unknown method {method!r}"))
+                return
+            out = {}
+            with self.slots[slot], metrics.collect() as timings:
+                items = getattr(self.local, method)(out=out, **kwargs)
+                try:
+                    for item in items:
+                        conn.send(("item", item))
+                finally:
+                    items.close()
+            conn.send(("end", dict(out, timings=timings)))
+        except (EOFError, OSError):
+            pass  # the UI worker went away (cancelled job or restart)
+        except Exception as e:
+            try:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+            except OSError:
+                pass
+        finally:
+            conn.close()
+
+    def serve_forever(self):
+        with Listener(self.address, authkey=self.authkey) as listener:
+            print(f"Model server listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, OSError) as e:
+                    print(f"Model server: rejected connection: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+
+if __name__ == "__main__":
+    from models import warmup
+    server = ModelServer(MODEL_SERVER or DEFAULT_ADDRESS)
+    if os.environ.get("SCRIBE_WARMUP", "1") == "1":
+        warmup()
+    server.serve_forever()
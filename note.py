@@ -0,0 +1,157 @@
+import json
+import re
+from dataclasses import dataclass, field, asdict
+from typing import List
+
+# --------------------------
+# Sections
+# --------------------------
+# key: (rendered heading, heading pattern, short key for compact storage)
+SECTIONS = {
+    "chief_complaint": ("📝 Chief Complaint", r"chief complaints?", "cc"),
+    "history_of_present_illness": ("📖 History of Present Illness", r"history of (?:the )?present(?:ing)? illness|hpi", "hpi"),
+    "past_history": ("📜 Relevant Past History", r"(?:relevant )?past (?:medical )?history", "ph"),
+    "findings": ("🔍 Symptoms & Examination Findings", r"symptoms (?:&|and) (?:examination )?findings|examination findings", "fx"),
+    "assessment": ("🩺 Assessment / Impression", r"assessment(?:\s*(?:/|and|&)\s*impression)?|impression|probable diagnosis", "as"),
+    "plan": ("🧾 Plan", r"(?:treatment |management )?plan", "pl"),
+    "suggested_medications": ("💊 Suggested Medications (with purpose)", r"suggested medications?(?: with purpose)?", "sm"),
+    "predicted_medications": ("💊 Predicted Medications (with purpose)", r"predicted medications?(?: with purpose)?", "pm"),
+    "predicted_disease": ("🩸 Predicted Disease", r"predicted disease", "pd"),
+}
+LIST_SECTIONS = ("suggested_medications", "predicted_medications")
+
+# A heading is a section name at the start of the line (after markdown
+# markers or numbering), followed by a colon or the end of the line.
+# "Plan to review in a week" is therefore content, not a heading.
+_HEADING = re.compile(
+    r"^[\s#*>\-•\d.)]*(?:"
+    + "|".join(f"(?P<{key}>{pattern})" for key, (_, pattern, _) in SECTIONS.items())
+    + r")\b[\s*]*(?:\([^)]*\))?[\s*]*(?::[\s*]*(?P<rest>.*)|$)",
+    re.IGNORECASE,
+)
+_BULLET = re.compile(r"^(?:[-*•]|\d+[.)])\s+")
+_MARKERS = " #*>-•0123456789.)"
+_PREFIXES = {"chi", "his", "hpi", "rel", "pas", "sym", "exa", "ass", "imp", "pro", "tre", "man", "pla", "sug", "pre"}
+_SHORT = {short: key for key, (_, _, short) in SECTIONS.items()}
+
+
+# --------------------------
+# Note object
+# --------------------------
+@dataclass
+class ClinicalNote:
+    chief_complaint: str = ""
+    history_of_present_illness: str = ""
+    past_history: str = ""
+    findings: str = ""
+    assessment: str = ""
+    plan: str = ""
+    suggested_medications: List[str] = field(default_factory=list)
+    predicted_medications: List[str] = field(default_factory=list)
+    predicted_disease: str = ""
+    other: List[str] = field(default_factory=list)   # lines before the first heading
+    order: List[str] = field(default_factory=list)   # sections in the order they appeared
+
+    # ---- renderers ----
+    def to_text(self) -> str:
+        """
+        Render in the emoji format shown in the UI and sent to patients.
+        """
+        parts = [line + "\n" for line in self.other]
+        for key in self.order:
+            parts.append(f"\n{SECTIONS[key][0]}\n")
+            value = getattr(self, key)
+            if key in LIST_SECTIONS:
+                parts.extend(f"- {item}\n" for item in value)
+            elif value:
+                parts.append(value + "\n")
+        return "".join(parts)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, **kwargs)
+
+    def to_compact(self) -> str:
+        """
+        Short keys, empty sections dropped, no whitespace: for storage.
+        """
+        data = {SECTIONS[key][2]: getattr(self, key) for key in self.order if getattr(self, key)}
+        if self.other:
+            data["o"] = self.other
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+    # ---- loaders ----
+    @classmethod
+    def from_dict(cls, data: dict) -> "ClinicalNote":
+        note = cls(**{k: v for k, v in data.items() if k in cls.__dataclass_fields__})
+        if not note.order:
+            note.order = [key for key in SECTIONS if getattr(note, key)]
+        return note
+
+    @classmethod
+    def from_json(cls, text: str) -> "ClinicalNote":
+        return cls.from_dict(json.loads(text))
+
+    @classmethod
+    def from_compact(cls, text: str) -> "ClinicalNote":
+        data = json.loads(text)
+        note = cls(other=data.pop("o", []))
+        for short, value in data.items():
+            key = _SHORT[short]
+            setattr(note, key, value)
+            note.order.append(key)
+        return note
+
+
+# --------------------------
+# Parser
+# --------------------------
+def parse_note(raw_text: str) -> ClinicalNote:
+    """
+    Parse llama output into a ClinicalNote in a single pass over its lines.
+    """
+    note = ClinicalNote()
+    lines = {}
+    current = note.other
+    for line in raw_text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        # Cheap prefix test first: only lines that could start a heading pay for the regex
+        m = _HEADING.match(line) if line.lstrip(_MARKERS)[:3].lower() in _PREFIXES else None
+        if m:
+            key = next(key for key in SECTIONS if m.group(key))
+            if key not in lines:
+                note.order.append(key)
+                lines[key] = []
+            current = lines[key]
+            rest = m.group("rest")
+            if rest:
+                rest = rest.strip(" *")
+                if rest:
+                    current.append(rest)
+        else:
+            current.append(line)
+
+    for key, values in lines.items():
+        if key in LIST_SECTIONS:
+            setattr(note, key, [_BULLET.sub("", v) for v in values])
+        else:
+            setattr(note, key, "\n".join(values))
+    return note
+
+
+# --------------------------
+# JSON output from Ollama
+# --------------------------
+# Passed as `format=` so llama returns the note as JSON directly
+NOTE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        key: ({"type": "array", "items": {"type": "string"}} if key in LIST_SECTIONS else {"type": "string"})
+        for key in SECTIONS
+    },
+    "required": list(SECTIONS),
+}
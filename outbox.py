@@ -0,0 +1,157 @@
+import atexit
+import os
+import socket
+import threading
+import time
+import uuid
+
+import db
+
+# --------------------------
+# Config
+# --------------------------
+TRANSPORT = os.environ.get("SCRIBE_OUTBOX_TRANSPORT", "whatsapp")   # whatsapp | stub
+MAX_ATTEMPTS = int(os.environ.get("SCRIBE_OUTBOX_MAX_ATTEMPTS", "5"))
+BACKOFF_BASE = 30.0      # seconds before the first retry, doubled on each attempt
+BACKOFF_MAX = 30 * 60.0
+POLL_INTERVAL = 5.0      # idle wait between checks for due messages
+LEASE_NAME = "outbox"
+LEASE_TTL = 120.0        # a sender that stops renewing (crash) is replaced after this; longer than a send
+
+
+# --------------------------
+# Transports
+# --------------------------
+class WhatsAppTransport:
+    """
+    Sends through WhatsApp Web by driving the browser (pywhatkit + pyautogui).
+    """
+
+    def send(self, to_number, message):
+        from whatsapp import send_prescription  # imported lazily: opens GUI tooling
+        return send_prescription(to_number, message)
+
+
+class StubTransport:
+    """
+    Records messages instead of sending them; fails the first `fail_first`
+    sends to exercise retries.
+    """
+
+    def __init__(self, fail_first: int = 0):
+        self.sent = []
+        self.fail_first = fail_first
+
+    def send(self, to_number, message):
+        if self.fail_first > 0:
+            self.fail_first -= 1
+            raise RuntimeError("stub transport failure")
+        self.sent.append((to_number, message))
+        return f"✅ Stub message to {to_number}"
+
+
+TRANSPORTS = {"whatsapp": WhatsAppTransport, "stub": StubTransport}
+
+
+def backoff(attempts: int) -> float:
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempts)
+
+
+# --------------------------
+# Worker
+# --------------------------
+class OutboxWorker:
+    """
+    Single background thread that delivers queued messages one at a time
+    (GUI-driven sends cannot overlap) and retries failures with
+    exponential backoff. With several processes on one database, only the
+    holder of the outbox lease sends; the others stand by and take over
+    once it stops renewing the lease.
+    """
+
+    def __init__(self, transport=None):
+        self.transport = transport or TRANSPORTS[TRANSPORT]()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._sender = False
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._sender:
+            db.release_lease(LEASE_NAME, self.owner)
+            self._sender = False
+
+    def hold_lease(self) -> bool:
+        """
+        Take or renew the outbox lease; True while this worker is the sender.
+        """
+        held = db.acquire_lease(LEASE_NAME, self.owner, time.time(), LEASE_TTL)
+        if held and not self._sender:
+            # The previous sender is gone: its in-flight messages go back to the queue
+            db.reset_stuck_messages()
+            print(f"Outbox: {self.owner} is now the sender")
+        self._sender = held
+        return held
+
+    def notify(self):
+        self._wake.set()
+
+    def process_one(self) -> bool:
+        """
+        Deliver the next due message. Returns False when nothing is due.
+        """
+        msg = db.claim_message(time.time())
+        if msg is None:
+            return False
+        mid, to_number, message, attempts = msg
+        try:
+            self.transport.send(to_number, message)
+            db.mark_message_sent(mid, time.time())
+            print(f"Outbox: message {mid} sent to {to_number}")
+        except Exception as e:
+            attempts += 1
+            retry_at = time.time() + backoff(attempts - 1) if attempts < MAX_ATTEMPTS else None
+            db.mark_message_failed(mid, str(e), retry_at)
+            print(f"Outbox: message {mid} attempt {attempts} failed: {e}")
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.hold_lease() and self.process_one():
+                    continue
+            except Exception as e:
+                print(f"Outbox worker error: {e}")
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker() -> OutboxWorker:
+    """
+    Return the process-wide outbox worker, starting it on first use.
+    """
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = OutboxWorker()
+                _worker.start()
+                atexit.register(_worker.stop)
+    return _worker
+
+
+def notify():
+    # Only wakes a worker running in this process; workers elsewhere poll
+    if _worker is not None:
+        _worker.notify()
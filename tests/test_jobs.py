@@ -0,0 +1,117 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jobs  # noqa: E402
+
+
+class FakeInference:
+    """
+    Stands in for LocalInference: drafts are instant, refinements wait for
+    `release` so tests control when they finish.
+    """
+
+    def __init__(self, refined="fever for three days", fail_refine=False, fail_final_note=False):
+        self.refined = refined
+        self.fail_refine = fail_refine
+        self.fail_final_note = fail_final_note
+        self.release = threading.Event()
+
+    def transcribe(self, audio_path, out, tier="final"):
+        if tier == jobs.DRAFT:
+            yield "[0.00s - 1.00s] : fever for two days"
+            return
+        self.release.wait(5)
+        if self.fail_refine:
+            raise RuntimeError("gpu out of memory")
+        yield f"[0.00s - 1.10s] : {self.refined}"
+
+    def generate(self, transcript, out, raise_errors=False):
+        if "three" in transcript and self.fail_final_note:
+            if raise_errors:
+                raise RuntimeError("llama host down")
+            yield "\nError: llama host down"
+            return
+        yield "NOTE: " + transcript.split(" : ", 1)[1]
+
+
+def make_queue(monkeypatch, fake, **kw):
+    monkeypatch.setattr(jobs, "get_inference", lambda: fake)
+    return jobs.EncounterQueue(tiered=True, **kw)
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_draft_then_final(monkeypatch):
+    fake = FakeInference()
+    q = make_queue(monkeypatch, fake)
+    job = q.submit("a.wav")
+    assert wait_for(lambda: q.status(job.id)["status"] == jobs.REFINING)
+    snap = q.status(job.id)
+    assert snap["version"] == jobs.DRAFT
+    assert snap["note"] == "NOTE: fever for two days"
+
+    fake.release.set()
+    assert wait_for(lambda: q.status(job.id)["status"] in jobs.FINISHED)
+    snap = q.status(job.id)
+    assert (snap["status"], snap["version"], snap["error"]) == (jobs.DONE, jobs.FINAL, None)
+    assert snap["note"] == "NOTE: fever for three days"
+    assert snap["draft_note"] == "NOTE: fever for two days"
+    assert q.pending() == 0
+
+
+def test_unchanged_refinement_keeps_draft_note(monkeypatch):
+    fake = FakeInference(refined="fever for two days")
+    fake.release.set()
+    q = make_queue(monkeypatch, fake)
+    job = q.submit("a.wav")
+    assert wait_for(lambda: q.status(job.id)["status"] in jobs.FINISHED)
+    snap = q.status(job.id)
+    assert (snap["version"], snap["note"], snap["draft_note"]) == (jobs.FINAL, "NOTE: fever for two days", "")
+
+
+def test_failed_refinement_keeps_draft(monkeypatch):
+    fake = FakeInference(fail_refine=True)
+    fake.release.set()
+    q = make_queue(monkeypatch, fake)
+    job = q.submit("a.wav")
+    assert wait_for(lambda: q.status(job.id)["status"] in jobs.FINISHED)
+    snap = q.status(job.id)
+    assert (snap["status"], snap["version"]) == (jobs.DONE, jobs.DRAFT)
+    assert snap["note"] == "NOTE: fever for two days"
+    assert "gpu out of memory" in snap["error"]
+
+
+def test_failed_final_note_keeps_draft(monkeypatch):
+    fake = FakeInference(fail_final_note=True)
+    fake.release.set()
+    q = make_queue(monkeypatch, fake)
+    job = q.submit("a.wav")
+    assert wait_for(lambda: q.status(job.id)["status"] in jobs.FINISHED)
+    snap = q.status(job.id)
+    assert (snap["status"], snap["version"]) == (jobs.DONE, jobs.DRAFT)
+    assert snap["note"] == "NOTE: fever for two days"
+    assert "llama host down" in snap["error"]
+
+
+def test_cancel_while_waiting_for_refinement(monkeypatch):
+    fake = FakeInference()
+    q = make_queue(monkeypatch, fake, refine_workers=1)
+    a, b = q.submit("a.wav"), q.submit("b.wav")
+    # The single refine worker is busy with A; B waits in the refine queue
+    assert wait_for(lambda: q.status(b.id)["status"] == jobs.REFINING)
+    assert q.cancel(b.id)
+    fake.release.set()
+    assert wait_for(lambda: q.status(b.id)["status"] == jobs.CANCELLED)
+    assert wait_for(lambda: q.status(a.id)["status"] == jobs.DONE)
+    assert q.pending() == 0
@@ -0,0 +1,89 @@
+import hashlib
+import os
+
+# --------------------------
+# Config
+# --------------------------
+THUMB_DIR = os.environ.get("SCRIBE_THUMB_DIR", "report_thumbnails")
+THUMB_SIZE = (320, 320)
+THUMB_QUALITY = 80
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+PDF_PLACEHOLDER = os.path.join(THUMB_DIR, "_pdf.png")
+
+
+def thumb_path_for(src_path: str) -> str:
+    # Keyed by source path so re-uploads under a new name get their own thumbnail
+    name = hashlib.sha1(os.path.abspath(src_path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(THUMB_DIR, f"{name}.jpg")
+
+
+# --------------------------
+# Renderers
+# --------------------------
+def _image_thumbnail(src_path: str, dest: str):
+    from PIL import Image
+    with Image.open(src_path) as img:
+        img.draft("RGB", THUMB_SIZE)  # JPEG: decode at reduced scale instead of full resolution
+        img = img.convert("RGB")
+        img.thumbnail(THUMB_SIZE)
+        img.save(dest, "JPEG", quality=THUMB_QUALITY, optimize=True)
+
+
+def _pdf_thumbnail(src_path: str, dest: str) -> bool:
+    """
+    Render the first page with PyMuPDF, or pdf2image (poppler) if installed.
+    """
+    try:
+        import fitz  # PyMuPDF
+        with fitz.open(src_path) as doc:
+            page = doc.load_page(0)
+            zoom = THUMB_SIZE[0] / max(page.rect.width, page.rect.height)
+            page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).save(dest, jpg_quality=THUMB_QUALITY)
+        return True
+    except ImportError:
+        pass
+    try:
+        from pdf2image import convert_from_path
+        pages = convert_from_path(src_path, first_page=1, last_page=1, size=THUMB_SIZE)
+        pages[0].save(dest, "JPEG", quality=THUMB_QUALITY)
+        return True
+    except ImportError:
+        return False
+
+
+def _pdf_placeholder() -> str:
+    if not os.path.exists(PDF_PLACEHOLDER):
+        from PIL import Image, ImageDraw
+        img = Image.new("RGB", (THUMB_SIZE[0] * 3 // 4, THUMB_SIZE[1]), "white")
+        draw = ImageDraw.Draw(img)
+        draw.rectangle([0, 0, img.width - 1, img.height - 1], outline="#999999", width=3)
+        draw.text((img.width // 2 - 10, img.height // 2 - 5), "PDF", fill="#cc0000")
+        img.save(PDF_PLACEHOLDER)
+    return PDF_PLACEHOLDER
+
+
+def make_thumbnail(src_path: str):
+    """
+    Create a small JPEG preview of an uploaded report and return its path.
+    PDFs show their first page when a renderer is installed, otherwise a
+    generic placeholder. Returns None if the file cannot be previewed.
+    """
+    os.makedirs(THUMB_DIR, exist_ok=True)
+    dest = thumb_path_for(src_path)
+    if os.path.exists(dest):
+        return dest
+    ext = os.path.splitext(src_path)[1].lower()
+    try:
+        if ext in IMAGE_EXTS:
+            _image_thumbnail(src_path, dest)
+            return dest
+        if ext == ".pdf":
+            try:
+                if _pdf_thumbnail(src_path, dest):
+                    return dest
+            except Exception as e:
+                print(f"PDF preview failed for {src_path}: {e}")
+            return _pdf_placeholder()
+    except Exception as e:
+        print(f"Thumbnail failed for {src_path}: {e}")
+    return None
@@ -1,6 +1,7 @@
 import pywhatkit
 import pyautogui
 import time
+from metrics import span
 
 def send_prescription(to_number, prescription_text):
     # Ensure +91 prefix
@@ -11,16 +12,17 @@ def send_prescription(to_number, prescription_text):
     phone_number = to_number
     message = prescription_text
 
-    # Open WhatsApp chat with message
-    pywhatkit.sendwhatmsg_instantly(phone_number, message, wait_time=10, tab_close=True)
+    with span("send_prescription"):
+        # Open WhatsApp chat with message
+        pywhatkit.sendwhatmsg_instantly(phone_number, message, wait_time=10, tab_close=True)
 
-    # Wait a few seconds for chat to load
-    #
-    # 
-    time.sleep(5)
+        # Wait a few seconds for chat to load
+        #
+        # 
+        time.sleep(5)
 
-    # Press Enter to send
-    pyautogui.press("enter")
+        # Press Enter to send
+        pyautogui.press("enter")
 
     return(f"✅ Message sent instantly to {phone_number}")
 